@@ -1,32 +1,142 @@
 #!/usr/bin/env python3
 """
-Small deployment and log helper for Medora Health Beauty.
+Deployment, build and operations helper for Medora Health Beauty.
 
 The production app is deployed on Vercel. Cloudflare fronts the domain for
 DNS/CDN/security/R2, so the Cloudflare "deploy" action here is cache purge.
+Besides deploys and purges it manages DNS records, tails and aggregates
+Vercel/Cloudflare logs and security events, audits and warms the CDN cache,
+benchmarks routes, caches local builds, runs the parallel preflight and sharded
+vitest jobs, reports bundle sizes, and runs multi-step plans from a shell or
+daemon. See OPS_README.md.
 """
 
 from __future__ import annotations
 
 import argparse
+import asyncio
+import codecs
+import collections
+import contextlib
+import cProfile
+import email.utils
+import functools
+import gzip
+import hashlib
+import heapq
+import http.client
+import io
+import itertools
 import json
+import math
 import os
+import posixpath
+import pstats
+import queue
+import random
 import re
+import selectors
+import shlex
+import shutil
+import signal
+import socket
+import sqlite3
 import subprocess
 import sys
-import urllib.error
+import threading
+import time
 import urllib.parse
 import urllib.request
+import xml.etree.ElementTree as ElementTree
+import zlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta, timezone
+from html.parser import HTMLParser
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Iterator
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 
 ROOT = Path(__file__).resolve().parents[1]
 STATE_DIR = ROOT / ".ops"
 LAST_DEPLOYMENT_FILE = STATE_DIR / "last-vercel-deployment.txt"
+MANIFEST_DIR = STATE_DIR / "manifests"
+BUILD_MANIFEST_FILE = MANIFEST_DIR / "latest-build.json"
+DEPLOYED_MANIFEST_FILE = MANIFEST_DIR / "production.json"
+BUNDLE_REPORT_FILE = MANIFEST_DIR / "bundle-latest.json"
+DEPLOYED_BUNDLE_FILE = MANIFEST_DIR / "bundle-production.json"
+BUNDLE_TEXT_SUFFIXES = {".js", ".mjs", ".css", ".html", ".json", ".svg", ".xml", ".txt", ".webmanifest"}
+# Allowed growth of total compressed JS/CSS over the last production deploy.
+BUNDLE_JS_BUDGET_KB = 10
+BUNDLE_CSS_BUDGET_KB = 5
+STATIC_IMPORT_RE = re.compile(r"""(?:\bimport|\bfrom|\bexport\s*\*\s*from)\s*["']([^"']+\.m?js)["']""")
+DYNAMIC_IMPORT_RE = re.compile(r"""\bimport\(\s*["']([^"']+\.m?js)["']\s*\)""")
+DIST_DIR = ROOT / "dist"
+BUILD_CACHE_DIR = STATE_DIR / "build-cache"
+BUILD_CACHE_KEEP = 3
+BUILD_INPUTS = [
+    "src",
+    "public",
+    "admin/public",
+    "index.html",
+    "package.json",
+    "package-lock.json",
+    "pnpm-lock.yaml",
+    "vite.config.ts",
+    "tailwind.config.js",
+    "tsconfig.json",
+    "scripts/generate-sitemap.mjs",
+    "scripts/prerender-public-seo.mjs",
+    # Read by src/services/publicSeoFallbacks.js during the SEO prerender.
+    "scripts/data",
+    ".env",
+    ".env.local",
+    ".env.production",
+    ".env.production.local",
+]
+# Written by `npm run build` itself, so they must not feed the input hash.
+BUILD_GENERATED = {"public/index.css", "public/sitemap.xml"}
+BUILD_ENV_PREFIXES = ("VITE_", "SUPABASE_", "GEMINI_")
+PREFLIGHT_DIR = STATE_DIR / "preflight"
+PREFLIGHT_LOG_TAIL = 40
+TEST_DIR = ROOT / "test"
+VITEST_PATTERNS = ("*.test.ts", "*.test.tsx")
+VITEST_DIR = STATE_DIR / "vitest"
+VITEST_TIMINGS_FILE = VITEST_DIR / "timings.json"
+BENCH_HISTORY_FILE = STATE_DIR / "bench-history.json"
+EVENTS_DB = STATE_DIR / "firewall-events.sqlite3"
+CACHE_DIR = STATE_DIR / "cache"
+ZONE_ID_TTL = 7 * 24 * 3600
+RATE_LIMIT_DIR = STATE_DIR / "rate-limit"
+# Cloudflare allows 1200 API requests per user token every five minutes.
+CF_BUDGET_REQUESTS = 1200
+CF_BUDGET_WINDOW = 300
+DAEMON_SOCKET = STATE_DIR / "ops.sock"
 DEFAULT_PROJECT = "medora-health-beauty"
 DEFAULT_CF_ZONE_NAME = "medorabeauty.com"
+DEFAULT_SITEMAP = ROOT / "public" / "sitemap.xml"
+DEFAULT_SITE_ORIGINS = ["https://medorabeauty.com", "https://www.medorabeauty.com"]
+DEFAULT_BENCH_ROUTES = ["/", "/procedure/Rhinoplasty", "/surgeons", "/api/surgeons"]
+CF_API_BASE = "https://api.cloudflare.com/client/v4"
+VERCEL_API_BASE = "https://api.vercel.com"
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Methods that may be replayed after a 5xx or a dropped connection; others only retry on 429 or a failed connect.
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT"}
+CF_PURGE_CHUNK = 30
+DNS_PAGE_SIZE = 100
+# Changes per /dns_records/batch call; each call is applied atomically.
+DNS_BATCH_SIZE = 200
+SITEMAP_NS = "{http://www.sitemaps.org/schemas/sitemap/0.9}"
 
 
 def load_dotenv() -> None:
@@ -76,26 +186,573 @@ def printable_cmd(cmd: list[str]) -> str:
 
 def run(cmd: list[str], *, cwd: Path = ROOT, capture: bool = False) -> str:
     print(f"$ {printable_cmd(cmd)}", flush=True)
-    if capture:
-        result = subprocess.run(cmd, cwd=cwd, text=True, capture_output=True, check=False)
-        if result.stdout:
-            print(result.stdout, end="")
-        if result.stderr:
-            print(result.stderr, end="", file=sys.stderr)
+    with TRACE.span(cmd[0], "subprocess", command=printable_cmd(cmd)):
+        if sys.stdout is not sys.__stdout__:
+            # stdout is redirected (daemon client or captured plan step): relay the
+            # child's output through it instead of the inherited file descriptor.
+            output = relay_process(cmd, cwd=cwd)
+            return output if capture else ""
+        if capture:
+            result = subprocess.run(cmd, cwd=cwd, text=True, capture_output=True, check=False)
+            if result.stdout:
+                print(result.stdout, end="")
+            if result.stderr:
+                print(result.stderr, end="", file=sys.stderr)
+            if result.returncode != 0:
+                raise SystemExit(result.returncode)
+            return result.stdout
+
+        result = subprocess.run(cmd, cwd=cwd, check=False)
         if result.returncode != 0:
             raise SystemExit(result.returncode)
-        return result.stdout
+        return ""
 
-    result = subprocess.run(cmd, cwd=cwd, check=False)
-    if result.returncode != 0:
-        raise SystemExit(result.returncode)
-    return ""
 
+def relay_process(cmd: list[str], *, cwd: Path) -> str:
+    # Both pipes are read from this thread so per-thread stdout wrappers
+    # (run-plan prefixes) still apply; only stdout is returned to the caller.
+    process = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    assert process.stdout is not None and process.stderr is not None
+    targets = {process.stdout: sys.stdout, process.stderr: sys.stderr}
+    decoders = {pipe: codecs.getincrementaldecoder("utf-8")(errors="replace") for pipe in targets}
+    output: list[str] = []
+    with selectors.DefaultSelector() as selector:
+        for pipe in targets:
+            selector.register(pipe, selectors.EVENT_READ)
+        while selector.get_map():
+            for key, _ in selector.select():
+                chunk = os.read(key.fileobj.fileno(), 65536)
+                text = decoders[key.fileobj].decode(chunk, final=not chunk)
+                if not chunk:
+                    selector.unregister(key.fileobj)
+                if not text:
+                    continue
+                if key.fileobj is process.stdout:
+                    output.append(text)
+                targets[key.fileobj].write(text)
+                targets[key.fileobj].flush()
+    if process.wait() != 0:
+        raise SystemExit(process.returncode)
+    return "".join(output)
 
-def vercel_base_args(args: argparse.Namespace) -> list[str]:
+
+class Tracer:
+    """Collects spans as Chrome trace events (chrome://tracing, ui.perfetto.dev)."""
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.events: list[dict[str, Any]] = []
+        self.origin = time.perf_counter()
+        self._threads: set[int] = set()
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            self.enabled = True
+            self.events = []
+            self._threads = set()
+            self.origin = time.perf_counter()
+
+    def complete(self, name: str, category: str, started: float, ended: float, **fields: Any) -> None:
+        if not self.enabled:
+            return
+        thread = threading.current_thread()
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": round((started - self.origin) * 1e6, 1),
+            "dur": round((ended - started) * 1e6, 1),
+            "pid": os.getpid(),
+            "tid": thread.ident,
+            "args": fields,
+        }
+        with self._lock:
+            if thread.ident not in self._threads:
+                self._threads.add(thread.ident)
+                self.events.append(
+                    {
+                        "name": "thread_name",
+                        "ph": "M",
+                        "pid": os.getpid(),
+                        "tid": thread.ident,
+                        "args": {"name": thread.name},
+                    }
+                )
+            self.events.append(event)
+
+    @contextlib.contextmanager
+    def span(self, name: str, category: str = "ops", **fields: Any) -> Iterator[dict[str, Any]]:
+        started = time.perf_counter()
+        try:
+            yield fields
+        finally:
+            self.complete(name, category, started, time.perf_counter(), **fields)
+
+    def write(self, path: Path) -> None:
+        with self._lock:
+            events, self.enabled = list(self.events), False
+        path.write_text(json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}), encoding="utf-8")
+
+
+TRACE = Tracer()
+
+
+class ConnectError(OSError):
+    """Opening the connection failed, so nothing was sent and any request can be retried."""
+
+
+@dataclass
+class HttpResponse:
+    status: int
+    headers: dict[str, str]
+    body: bytes
+    ttfb: float
+    elapsed: float
+
+    def json(self) -> Any:
+        with TRACE.span("json decode", "parse", bytes=len(self.body)):
+            return json.loads(self.body.decode("utf-8"))
+
+    def text(self) -> str:
+        return self.body.decode("utf-8", errors="replace")
+
+
+@dataclass
+class RequestTiming:
+    method: str
+    host: str
+    path: str
+    status: int
+    attempt: int
+    reused: bool
+    connect: float
+    ttfb: float
+    elapsed: float
+
+
+@dataclass
+class HttpClient:
+    """Keep-alive HTTP(S) client with a per-host connection pool and retries."""
+
+    timeout: float = 30.0
+    max_retries: int = 4
+    backoff_base: float = 0.5
+    backoff_max: float = 30.0
+    pool_size: int = 8
+    timings: list[RequestTiming] = field(default_factory=list)
+    _idle: dict[tuple[str, str, int], list[http.client.HTTPConnection]] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        *,
+        headers: dict[str, str] | None = None,
+        body: bytes | None = None,
+        idempotent: bool | None = None,
+        before_send: Callable[[], Any] | None = None,
+    ) -> HttpResponse:
+        key, path = self._target(url)
+        repeatable = method.upper() in IDEMPOTENT_METHODS if idempotent is None else idempotent
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                response = self._send(
+                    key, method, path, headers or {}, body, attempt, repeatable, before_send
+                )
+            except OSError as error:
+                if attempt > self.max_retries or not (repeatable or isinstance(error, ConnectError)):
+                    raise
+                self._sleep(self._backoff(attempt, None))
+                continue
+            if self._should_retry(response.status, repeatable) and attempt <= self.max_retries:
+                self._sleep(self._backoff(attempt, response.headers.get("retry-after")))
+                continue
+            return response
+
+    @contextlib.contextmanager
+    def stream(
+        self,
+        method: str,
+        url: str,
+        *,
+        headers: dict[str, str] | None = None,
+        body: bytes | None = None,
+        idempotent: bool | None = None,
+    ) -> Iterator[http.client.HTTPResponse]:
+        key, path = self._target(url)
+        repeatable = method.upper() in IDEMPOTENT_METHODS if idempotent is None else idempotent
+        attempt = 0
+        while True:
+            attempt += 1
+            started = time.perf_counter()
+            conn = self._acquire(key)
+            reused = conn is not None
+            connect = 0.0
+            if conn is None:
+                conn = self._connect(key)
+                connect = time.perf_counter() - started
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                raw = conn.getresponse()
+            except BaseException:
+                conn.close()
+                raise
+            ttfb = time.perf_counter() - started
+            self.timings.append(
+                RequestTiming(method, key[1], path, raw.status, attempt, reused, connect, ttfb, ttfb)
+            )
+            self._trace(method, key, path, raw.status, attempt, reused, started, connect, ttfb, ttfb)
+            if self._should_retry(raw.status, repeatable) and attempt <= self.max_retries:
+                raw.read()
+                self._finish(key, conn, raw)
+                self._sleep(self._backoff(attempt, raw.getheader("retry-after")))
+                continue
+            break
+        try:
+            yield raw
+        except BaseException:
+            conn.close()
+            raise
+        self._finish(key, conn, raw)
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for conn in connections:
+                conn.close()
+
+    def report(self) -> str:
+        if not self.timings:
+            return "No HTTP requests made."
+        lines = [f"{'status':>6} {'conn':>6} {'connect':>8} {'ttfb':>8} {'total':>8}  request"]
+        for timing in self.timings:
+            conn = "reused" if timing.reused else "new"
+            retry = f" (attempt {timing.attempt})" if timing.attempt > 1 else ""
+            lines.append(
+                f"{timing.status:>6} {conn:>6} {timing.connect * 1000:7.0f}ms "
+                f"{timing.ttfb * 1000:7.0f}ms {timing.elapsed * 1000:7.0f}ms  "
+                f"{timing.method} {timing.host}{timing.path.split('?', 1)[0]}{retry}"
+            )
+        fresh = [timing.connect for timing in self.timings if not timing.reused]
+        reused = sum(1 for timing in self.timings if timing.reused)
+        total = sum(timing.elapsed for timing in self.timings)
+        avg_connect = sum(fresh) / len(fresh) if fresh else 0.0
+        lines.append(
+            f"{len(self.timings)} requests in {total:.3f}s; {len(fresh)} new connections "
+            f"(avg connect {avg_connect * 1000:.0f}ms), {reused} reused "
+            f"(~{reused * avg_connect * 1000:.0f}ms of handshakes saved)"
+        )
+        return "\n".join(lines)
+
+    def _should_retry(self, status: int, repeatable: bool) -> bool:
+        # A 429 means the request was refused before it ran; a 5xx may have landed half-way.
+        return status == 429 or (repeatable and status in RETRY_STATUSES)
+
+    def _backoff(self, attempt: int, retry_after: str | None) -> float:
+        if retry_after:
+            delay = parse_retry_after(retry_after)
+            if delay is not None:
+                return min(delay, self.backoff_max)
+        cap = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+        return random.uniform(cap / 2, cap)
+
+    def _sleep(self, delay: float) -> None:
+        with TRACE.span("retry backoff", "http", seconds=round(delay, 3)):
+            time.sleep(delay)
+
+    def _trace(
+        self,
+        method: str,
+        key: tuple[str, str, int],
+        path: str,
+        status: int,
+        attempt: int,
+        reused: bool,
+        started: float,
+        connect: float,
+        ttfb: float,
+        elapsed: float,
+    ) -> None:
+        if not TRACE.enabled:
+            return
+        name = f"{method} {key[1]}{path.split('?', 1)[0]}"
+        TRACE.complete(
+            name, "http", started, started + elapsed, status=status, attempt=attempt, reused=reused
+        )
+        if connect:
+            TRACE.complete("connect (DNS+TCP+TLS)", "http", started, started + connect, host=key[1])
+        TRACE.complete("wait (TTFB)", "http", started + connect, started + ttfb)
+        if elapsed > ttfb:
+            TRACE.complete("read body", "http", started + ttfb, started + elapsed)
+
+    def _target(self, url: str) -> tuple[tuple[str, str, int], str]:
+        parsed = urllib.parse.urlsplit(url)
+        path = parsed.path or "/"
+        if parsed.query:
+            path += "?" + parsed.query
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        return (parsed.scheme, parsed.hostname or "", port), path
+
+    def _connect(self, key: tuple[str, str, int]) -> http.client.HTTPConnection:
+        scheme, host, port = key
+        proxy = urllib.request.getproxies().get(scheme)
+        if proxy and not urllib.request.proxy_bypass(host):
+            proxy_url = urllib.parse.urlsplit(proxy)
+            proxy_port = proxy_url.port or (443 if proxy_url.scheme == "https" else 80)
+            conn_cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            conn = conn_cls(proxy_url.hostname, proxy_port, timeout=self.timeout)
+            conn.set_tunnel(host, port)
+        elif scheme == "https":
+            conn = http.client.HTTPSConnection(host, port, timeout=self.timeout)
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=self.timeout)
+        try:
+            conn.connect()
+        except OSError as error:
+            conn.close()
+            raise ConnectError(f"cannot connect to {host}:{port}: {error}") from error
+        return conn
+
+    def _acquire(self, key: tuple[str, str, int]) -> http.client.HTTPConnection | None:
+        with self._lock:
+            idle = self._idle.get(key)
+            return idle.pop() if idle else None
+
+    def _release(self, key: tuple[str, str, int], conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.pool_size:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def _finish(
+        self,
+        key: tuple[str, str, int],
+        conn: http.client.HTTPConnection,
+        raw: http.client.HTTPResponse,
+    ) -> None:
+        if raw.will_close or not raw.isclosed():
+            conn.close()
+        else:
+            self._release(key, conn)
+
+    def _send(
+        self,
+        key: tuple[str, str, int],
+        method: str,
+        path: str,
+        headers: dict[str, str],
+        body: bytes | None,
+        attempt: int,
+        repeatable: bool,
+        before_send: Callable[[], Any] | None = None,
+    ) -> HttpResponse:
+        # Called before every request that goes on the wire, retries included.
+        if before_send:
+            before_send()
+        started = time.perf_counter()
+        conn = self._acquire(key)
+        reused = conn is not None
+        connect = 0.0
+        if conn is None:
+            conn = self._connect(key)
+            connect = time.perf_counter() - started
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            raw = conn.getresponse()
+            ttfb = time.perf_counter() - started
+            payload = raw.read()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            conn.close()
+            if not reused or not repeatable:
+                raise
+            # The server dropped an idle keep-alive connection; retry once on a fresh one.
+            return self._send(key, method, path, headers, body, attempt, repeatable, before_send)
+        except BaseException:
+            conn.close()
+            raise
+        elapsed = time.perf_counter() - started
+        self._finish(key, conn, raw)
+        response_headers = {name.lower(): value for name, value in raw.getheaders()}
+        self.timings.append(
+            RequestTiming(method, key[1], path, raw.status, attempt, reused, connect, ttfb, elapsed)
+        )
+        self._trace(method, key, path, raw.status, attempt, reused, started, connect, ttfb, elapsed)
+        return HttpResponse(raw.status, response_headers, payload, ttfb, elapsed)
+
+
+def parse_retry_after(value: str) -> float | None:
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+HTTP = HttpClient()
+
+
+class ApiError(SystemExit):
+    def __init__(self, service: str, status: int, payload: str) -> None:
+        super().__init__(f"{service} API error {status}: {payload}")
+        self.status = status
+        self.payload = payload
+
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across threads."""
+
+    def __init__(self, rate: float) -> None:
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+def chunked(items: list[Any], size: int) -> list[list[Any]]:
+    return [items[index : index + size] for index in range(0, len(items), size)]
+
+
+def read_url_file(path: str) -> list[str]:
+    try:
+        lines = Path(path).read_text(encoding="utf-8").splitlines()
+    except FileNotFoundError:
+        raise SystemExit(f"URL file not found: {path}") from None
+    except OSError as error:
+        raise SystemExit(f"Could not read URL file {path}: {error}") from error
+    return [line.strip() for line in lines if line.strip() and not line.lstrip().startswith("#")]
+
+
+def read_sitemap(source: str) -> list[str]:
+    if re.match(r"^https?://", source):
+        response = HTTP.request("GET", source, headers={"Accept": "application/xml"})
+        if response.status >= 400:
+            raise SystemExit(f"Could not fetch sitemap {source}: HTTP {response.status}")
+        root = ElementTree.fromstring(response.body)
+    else:
+        path = Path(source)
+        if not path.exists():
+            raise SystemExit(f"Sitemap not found: {source}. Run npm run generate:sitemap first.")
+        root = ElementTree.parse(path).getroot()
+
+    locs = [loc.text.strip() for loc in root.iter(f"{SITEMAP_NS}loc") if loc.text]
+    if root.tag == f"{SITEMAP_NS}sitemapindex":
+        urls: list[str] = []
+        for child in locs:
+            urls.extend(read_sitemap(child))
+        return urls
+    return locs
+
+
+def unique(items: list[str]) -> list[str]:
+    return list(dict.fromkeys(items))
+
+
+@dataclass
+class FetchResult:
+    url: str
+    status: int = 0
+    ttfb: float = 0.0
+    elapsed: float = 0.0
+    headers: dict[str, str] = field(default_factory=dict)
+    body: bytes = b""
+    error: str | None = None
+
+
+async def fetch_all(
+    urls: list[str],
+    *,
+    concurrency: int,
+    headers: dict[str, str] | None = None,
+    keep_body: bool = False,
+    on_result: Callable[[FetchResult], None] | None = None,
+) -> list[FetchResult]:
+    queue: asyncio.Queue[tuple[int, str]] = asyncio.Queue()
+    for item in enumerate(urls):
+        queue.put_nowait(item)
+    results: list[FetchResult | None] = [None] * len(urls)
+    HTTP.pool_size = max(HTTP.pool_size, concurrency)
+    workers = max(1, min(concurrency, len(urls)))
+    loop = asyncio.get_running_loop()
+    # asyncio's default executor has min(32, cpu + 4) threads, which would cap --concurrency.
+    executor = ThreadPoolExecutor(max_workers=workers)
+
+    async def worker() -> None:
+        while True:
+            try:
+                index, url = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                response = await loop.run_in_executor(
+                    executor, functools.partial(HTTP.request, "GET", url, headers=headers)
+                )
+                result = FetchResult(
+                    url,
+                    response.status,
+                    response.ttfb,
+                    response.elapsed,
+                    response.headers,
+                    response.body if keep_body else b"",
+                )
+            except OSError as error:
+                result = FetchResult(url, error=str(error))
+            results[index] = result
+            if on_result:
+                on_result(result)
+
+    try:
+        await asyncio.gather(*(worker() for _ in range(workers)))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+    return [result for result in results if result is not None]
+
+
+def fetch_urls(urls: list[str], **kwargs: Any) -> list[FetchResult]:
+    return asyncio.run(fetch_all(urls, **kwargs))
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = min(len(ordered), max(1, math.ceil(pct / 100 * len(ordered))))
+    return ordered[rank - 1]
+
+
+def rebase_url(url: str, origin: str | None) -> str:
+    if not origin:
+        return url
+    parsed = urllib.parse.urlsplit(url)
+    base = urllib.parse.urlsplit(origin)
+    return urllib.parse.urlunsplit((base.scheme, base.netloc, parsed.path, parsed.query, ""))
+
+
+def vercel_token(args: argparse.Namespace) -> str:
     token = args.vercel_token or env("VERCEL_TOKEN")
     if not token:
         raise SystemExit("Missing VERCEL_TOKEN. Create one in Vercel Account Settings > Tokens.")
+    return token
+
+
+def vercel_base_args(args: argparse.Namespace) -> list[str]:
+    token = vercel_token(args)
 
     cmd = ["npx", "vercel"]
     scope = args.vercel_scope or env("VERCEL_SCOPE")
@@ -105,6 +762,61 @@ def vercel_base_args(args: argparse.Namespace) -> list[str]:
     return cmd
 
 
+def vercel_url(args: argparse.Namespace, path: str, query: dict[str, Any] | None = None) -> str:
+    params = {key: value for key, value in (query or {}).items() if value is not None}
+    scope = args.vercel_scope or env("VERCEL_SCOPE")
+    if scope:
+        params["teamId" if scope.startswith("team_") else "slug"] = scope
+    url = VERCEL_API_BASE + path
+    if params:
+        url += "?" + urllib.parse.urlencode(params)
+    return url
+
+
+def vercel_headers(args: argparse.Namespace) -> dict[str, str]:
+    return {"Authorization": f"Bearer {vercel_token(args)}", "Accept": "application/json"}
+
+
+def vercel_request(
+    args: argparse.Namespace,
+    method: str,
+    path: str,
+    *,
+    query: dict[str, Any] | None = None,
+) -> Any:
+    response = HTTP.request(method, vercel_url(args, path, query), headers=vercel_headers(args))
+    if response.status >= 400:
+        raise ApiError("Vercel", response.status, response.text())
+    return response.json()
+
+
+def run_vercel(args: argparse.Namespace, api_call: Callable[[], None], cli_args: list[str]) -> None:
+    if not args.vercel_cli and not env("OPS_VERCEL_CLI"):
+        try:
+            api_call()
+            return
+        except OSError as error:
+            print(f"Vercel API request failed ({error}); falling back to the Vercel CLI.", file=sys.stderr)
+    run(vercel_base_args(args) + cli_args)
+
+
+def vercel_project_id(args: argparse.Namespace, project: str) -> str:
+    data = vercel_request(args, "GET", f"/v9/projects/{urllib.parse.quote(project, safe='')}")
+    return data["id"]
+
+
+def vercel_deployment(args: argparse.Namespace, deployment: str) -> dict[str, Any]:
+    id_or_url = re.sub(r"^https?://", "", deployment).rstrip("/")
+    return vercel_request(args, "GET", f"/v13/deployments/{urllib.parse.quote(id_or_url, safe='')}")
+
+
+def format_ms(timestamp_ms: int | float | None) -> str:
+    if not timestamp_ms:
+        return "-"
+    moment = datetime.fromtimestamp(timestamp_ms / 1000, tz=timezone.utc)
+    return moment.isoformat(timespec="seconds").replace("+00:00", "Z")
+
+
 def remember_deployment(output: str) -> str | None:
     urls = re.findall(r"https://[^\s]+", output)
     if not urls:
@@ -126,276 +838,3570 @@ def get_deployment_arg(value: str | None) -> str:
     )
 
 
-def cmd_vercel_deploy(args: argparse.Namespace) -> None:
-    if not args.skip_build:
-        run(["npm", "run", "build"])
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for block in iter(lambda: handle.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
 
-    cmd = vercel_base_args(args) + ["deploy", "--yes"]
-    if args.prod:
-        cmd.append("--prod")
-    if args.archive:
-        cmd += ["--archive", args.archive]
-    output = run(cmd, capture=True)
-    remember_deployment(output)
 
+def build_manifest(dist: Path = DIST_DIR) -> dict[str, str]:
+    return {
+        path.relative_to(dist).as_posix(): file_sha256(path)
+        for path in sorted(dist.rglob("*"))
+        if path.is_file()
+    }
 
-def cmd_vercel_list(args: argparse.Namespace) -> None:
-    project = args.project or env("VERCEL_PROJECT", default=DEFAULT_PROJECT)
-    cmd = vercel_base_args(args) + ["ls", project]
-    if args.environment:
-        cmd += ["--environment", args.environment]
-    if args.status:
-        cmd += ["--status", args.status]
-    run(cmd)
 
+def write_manifest(path: Path, files: dict[str, str], deployment: str | None = None) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {
+        "deployment": deployment,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "files": files,
+    }
+    path.write_text(json.dumps(payload, indent=2) + "\n", encoding="utf-8")
 
-def cmd_vercel_whoami(args: argparse.Namespace) -> None:
-    cmd = vercel_base_args(args) + ["whoami"]
-    run(cmd)
 
+def load_manifest(path: Path) -> dict[str, Any] | None:
+    if not path.exists():
+        return None
+    return json.loads(path.read_text(encoding="utf-8"))
 
-def cmd_vercel_build_logs(args: argparse.Namespace) -> None:
-    deployment = get_deployment_arg(args.deployment)
-    cmd = vercel_base_args(args) + ["inspect", deployment, "--logs"]
-    run(cmd)
 
+def diff_manifests(
+    old: dict[str, str], new: dict[str, str]
+) -> tuple[list[str], list[str], list[str]]:
+    added = sorted(name for name in new if name not in old)
+    changed = sorted(name for name in new if name in old and old[name] != new[name])
+    removed = sorted(name for name in old if name not in new)
+    return added, changed, removed
 
-def cmd_vercel_runtime_logs(args: argparse.Namespace) -> None:
-    deployment = get_deployment_arg(args.deployment)
-    cmd = vercel_base_args(args) + ["logs", deployment]
-    if args.json:
-        cmd.append("--json")
-    run(cmd)
 
+def file_routes(name: str) -> list[str]:
+    path = "/" + urllib.parse.quote(name)
+    if name == "index.html":
+        return ["/"]
+    if name.endswith("/index.html"):
+        route = path[: -len("/index.html")]
+        return [route, route + "/"]
+    if name.endswith(".html"):
+        return [path[: -len(".html")], path]
+    return [path]
 
-def cf_request(
-    method: str,
-    path: str,
-    *,
-    token: str,
-    body: dict[str, Any] | None = None,
-    api_base: str = "https://api.cloudflare.com/client/v4",
-) -> dict[str, Any]:
-    data = None
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Accept": "application/json",
-        "Content-Type": "application/json",
-    }
-    if body is not None:
-        data = json.dumps(body).encode("utf-8")
 
-    req = urllib.request.Request(
-        api_base + path,
-        data=data,
-        headers=headers,
-        method=method,
+def manifest_urls(names: list[str], origins: list[str]) -> list[str]:
+    return unique(
+        origin.rstrip("/") + route for name in names for route in file_routes(name) for origin in origins
     )
-    try:
-        with urllib.request.urlopen(req, timeout=30) as response:
-            return json.loads(response.read().decode("utf-8"))
-    except urllib.error.HTTPError as error:
-        payload = error.read().decode("utf-8", errors="replace")
-        raise SystemExit(f"Cloudflare API error {error.code}: {payload}") from error
 
 
-def cf_token(args: argparse.Namespace) -> str:
-    return args.cf_token or require_env("CLOUDFLARE_API_TOKEN", "CF_API_TOKEN")
+def purge_changed_files(args: argparse.Namespace, files: dict[str, str], deployment: str | None) -> None:
+    previous = load_manifest(DEPLOYED_MANIFEST_FILE)
+    if previous is None:
+        print("\nNo previous production manifest; saving this one as the baseline for the next deploy.")
+        write_manifest(DEPLOYED_MANIFEST_FILE, files, deployment)
+        return
 
+    added, changed, removed = diff_manifests(previous.get("files") or {}, files)
+    print(
+        f"\nBuild diff vs {previous.get('deployment') or 'previous deploy'}: "
+        f"{len(added)} added, {len(changed)} changed, {len(removed)} removed"
+    )
+    # Added files were never cached at the edge, so only changed and removed paths need a purge.
+    urls = manifest_urls(changed + removed, args.site_origin or DEFAULT_SITE_ORIGINS)
+    if urls and args.purge:
+        if not (args.cf_token or env("CLOUDFLARE_API_TOKEN", "CF_API_TOKEN")):
+            print("Skipping cache purge: no Cloudflare token. Changed URLs:")
+            print("\n".join(urls))
+            return
+        batches = [("files", chunk) for chunk in chunked(urls, CF_PURGE_CHUNK)]
+        if not purge_batches(cf_token(args), cf_zone_id(args), batches, concurrency=4, rate=5.0):
+            raise SystemExit("Cache purge failed; production manifest not updated so the next deploy retries it.")
+    elif urls:
+        print(f"{len(urls)} URLs changed; run cf-purge with --url-file to purge them:")
+        print("\n".join(urls))
+    else:
+        print("No cached URLs changed; nothing to purge.")
+    write_manifest(DEPLOYED_MANIFEST_FILE, files, deployment)
 
-def cf_zone_id(args: argparse.Namespace) -> str:
-    explicit = args.cf_zone_id or env("CLOUDFLARE_ZONE_ID", "CF_ZONE_ID")
-    if explicit:
-        return explicit
 
-    zone_name = args.cf_zone_name or env("CLOUDFLARE_ZONE_NAME", default=DEFAULT_CF_ZONE_NAME)
-    token = cf_token(args)
-    query = urllib.parse.urlencode({"name": zone_name})
-    data = cf_request("GET", f"/zones?{query}", token=token)
-    zones = data.get("result") or []
-    if not zones:
-        raise SystemExit(f"Could not find Cloudflare zone for {zone_name}. Set CF_ZONE_ID.")
-    return zones[0]["id"]
+def build_input_hash() -> str:
+    digest = hashlib.sha256()
+    for name in BUILD_INPUTS:
+        path = ROOT / name
+        if path.is_dir():
+            files = sorted(item for item in path.rglob("*") if item.is_file())
+        else:
+            files = [path] if path.is_file() else []
+        for item in files:
+            relative = item.relative_to(ROOT).as_posix()
+            if relative in BUILD_GENERATED or item.name == ".DS_Store":
+                continue
+            digest.update(f"{relative}\0{file_sha256(item)}\n".encode("utf-8"))
+    for key in sorted(os.environ):
+        if key.startswith(BUILD_ENV_PREFIXES):
+            digest.update(f"env:{key}={os.environ[key]}\n".encode("utf-8"))
+    return digest.hexdigest()[:24]
 
 
-def cmd_cf_zone(args: argparse.Namespace) -> None:
-    token = cf_token(args)
-    zone_id = cf_zone_id(args)
-    data = cf_request("GET", f"/zones/{zone_id}", token=token)
-    print(json.dumps(data.get("result", data), indent=2, ensure_ascii=False))
+def prune_build_cache(keep: int = BUILD_CACHE_KEEP) -> None:
+    entries = sorted(BUILD_CACHE_DIR.glob("*/build.json"), key=lambda path: path.stat().st_mtime, reverse=True)
+    for meta in entries[keep:]:
+        shutil.rmtree(meta.parent, ignore_errors=True)
 
 
-def cmd_cf_token_verify(args: argparse.Namespace) -> None:
-    token = cf_token(args)
-    data = cf_request("GET", "/user/tokens/verify", token=token)
-    result = data.get("result") or {}
-    status = result.get("status") or "unknown"
-    token_id = result.get("id") or "unknown"
-    print(f"Cloudflare token verified: status={status} id={token_id}")
+def build_preflight(args: argparse.Namespace, *, build: bool) -> None:
+    if not run_preflight(build=build, test_shards=os.cpu_count() or 1, concurrency=None, keep_going=False):
+        raise SystemExit("Preflight failed; not deploying.")
 
 
-def cmd_cf_zones(args: argparse.Namespace) -> None:
-    token = cf_token(args)
-    data = cf_request("GET", "/zones?per_page=100", token=token)
-    zones = data.get("result") or []
-    if not zones:
-        print("No Cloudflare zones visible to this token.")
+def build_dist(args: argparse.Namespace) -> None:
+    if args.skip_build:
+        return
+    with TRACE.span("hash build inputs"):
+        key = build_input_hash()
+    cached = BUILD_CACHE_DIR / key
+    meta_path = cached / "build.json"
+    meta = json.loads(meta_path.read_text(encoding="utf-8")) if meta_path.exists() else None
+    max_age = args.build_cache_max_age * 3600
+    if meta and not args.force_build and max_age > 0 and time.time() - meta["built"] < max_age:
+        built = datetime.fromtimestamp(meta["built"], timezone.utc).isoformat(timespec="seconds")
+        print(f"Build inputs unchanged ({key}); reusing dist/ built {built}. Pass --force-build to rebuild.")
+        with TRACE.span("restore cached dist"):
+            if DIST_DIR.exists():
+                shutil.rmtree(DIST_DIR)
+            shutil.copytree(cached / "dist", DIST_DIR)
+        os.utime(meta_path)
+        if args.preflight:
+            build_preflight(args, build=False)
         return
-    for zone in zones:
-        print(f"{zone.get('name')} {zone.get('id')} status={zone.get('status')}")
 
+    if args.preflight:
+        build_preflight(args, build=True)
+    else:
+        run(["npm", "run", "build"])
+    if not DIST_DIR.is_dir():
+        return
+    with TRACE.span("store dist in build cache"):
+        staging = BUILD_CACHE_DIR / f".{key}.{os.getpid()}"
+        shutil.rmtree(staging, ignore_errors=True)
+        shutil.copytree(DIST_DIR, staging / "dist")
+        meta = {"key": key, "built": time.time()}
+        (staging / "build.json").write_text(json.dumps(meta) + "\n", encoding="utf-8")
+        shutil.rmtree(cached, ignore_errors=True)
+        staging.replace(cached)
+        prune_build_cache()
 
-def cmd_cf_dns(args: argparse.Namespace) -> None:
-    token = cf_token(args)
-    zone_id = cf_zone_id(args)
-    data = cf_request("GET", f"/zones/{zone_id}/dns_records?per_page=100", token=token)
-    for record in data.get("result", []):
-        proxied = "proxied" if record.get("proxied") else "dns-only"
-        print(f"{record.get('type'):6} {record.get('name'):32} {record.get('content')} ({proxied})")
 
+@dataclass
+class ShellJob:
+    name: str
+    cmd: list[str]
+    needs: list[str] = field(default_factory=list)
+    files: list[str] = field(default_factory=list)
 
-def cmd_cf_purge(args: argparse.Namespace) -> None:
-    if not args.everything and not args.url:
-        raise SystemExit("Pass --everything or one/more --url values.")
 
-    token = cf_token(args)
-    zone_id = cf_zone_id(args)
-    body: dict[str, Any]
-    if args.everything:
-        body = {"purge_everything": True}
-    else:
-        body = {"files": args.url}
+# `vite build` copies public/ (the Tailwind CSS and sitemap) into dist/, and the
+# SEO prerender rewrites dist/; the vitest shards are independent of all of them.
+PREFLIGHT_JOBS = [
+    ShellJob("css", ["npm", "run", "build:css"]),
+    ShellJob("sitemap", ["npm", "run", "generate:sitemap"]),
+    ShellJob("vite-build", ["npx", "vite", "build"], ["css", "sitemap"]),
+    ShellJob("prerender", ["npm", "run", "generate:seo"], ["vite-build"]),
+]
 
-    data = cf_request("POST", f"/zones/{zone_id}/purge_cache", token=token, body=body)
-    print(json.dumps(data, indent=2, ensure_ascii=False))
 
+def run_logged(job: ShellJob, cancel: threading.Event, *, cwd: Path = ROOT) -> int:
+    PREFLIGHT_DIR.mkdir(parents=True, exist_ok=True)
+    log_path = PREFLIGHT_DIR / f"{job.name}.log"
+    with log_path.open("w", encoding="utf-8") as log:
+        with TRACE.span(job.cmd[0], "subprocess", command=printable_cmd(job.cmd)):
+            process = subprocess.Popen(
+                job.cmd, cwd=cwd, stdout=log, stderr=subprocess.STDOUT, start_new_session=hasattr(os, "killpg")
+            )
+            while True:
+                try:
+                    code = process.wait(timeout=0.2)
+                    break
+                except subprocess.TimeoutExpired:
+                    if not cancel.is_set():
+                        continue
+                    # Stop npm and the node processes it started, not only npm itself.
+                    if hasattr(os, "killpg"):
+                        os.killpg(process.pid, signal.SIGTERM)
+                    else:
+                        process.terminate()
+                    code = process.wait()
+                    break
 
-def cmd_cf_security_events(args: argparse.Namespace) -> None:
-    token = cf_token(args)
-    zone_id = cf_zone_id(args)
-    now = datetime.now(timezone.utc)
-    start = now - timedelta(minutes=args.minutes)
+    label = "ok" if code == 0 else ("cancelled" if cancel.is_set() else f"exit {code}")
+    print(f"{label:>9}  {job.name}  ({log_path.relative_to(ROOT)})", flush=True)
+    if code and not cancel.is_set():
+        lines = log_path.read_text(encoding="utf-8", errors="replace").splitlines()
+        print("\n".join(f"    {line}" for line in lines[-PREFLIGHT_LOG_TAIL:]), file=sys.stderr, flush=True)
+    return code
 
-    query = """
-    query ListFirewallEvents($zoneTag: string, $filter: FirewallEventsAdaptiveFilter_InputObject, $limit: uint64) {
-      viewer {
-        zones(filter: { zoneTag: $zoneTag }) {
-          firewallEventsAdaptive(filter: $filter, limit: $limit, orderBy: [datetime_DESC]) {
-            action
-            clientCountryName
-            clientIP
-            clientRequestHTTPHost
-            clientRequestPath
-            datetime
-            source
-            userAgent
-          }
-        }
-      }
-    }
-    """
-    body = {
-        "query": query,
-        "variables": {
-            "zoneTag": zone_id,
-            "limit": args.limit,
-            "filter": {
-                "datetime_geq": start.isoformat().replace("+00:00", "Z"),
-                "datetime_leq": now.isoformat().replace("+00:00", "Z"),
-            },
-        },
+
+def run_shell_jobs(jobs: list[ShellJob], *, concurrency: int, keep_going: bool) -> dict[str, JobResult]:
+    cancel = threading.Event()
+    graph: dict[str, tuple[list[str], Callable[[], int]]] = {
+        job.name: (job.needs, functools.partial(run_logged, job, cancel)) for job in jobs
     }
-    data = cf_request(
-        "POST",
-        "/graphql",
-        token=token,
-        body=body,
-    )
-    if data.get("errors"):
-        print(json.dumps(data, indent=2, ensure_ascii=False))
-        raise SystemExit(1)
+    for job in jobs:
+        print(f"{'queued':>9}  {job.name}: {printable_cmd(job.cmd)}", flush=True)
+    started = time.perf_counter()
+    results = run_dag(graph, concurrency=concurrency, keep_going=keep_going, cancel=cancel)
+    print_job_report(results, time.perf_counter() - started)
+    return results
 
-    zones = data.get("data", {}).get("viewer", {}).get("zones", [])
-    events = zones[0].get("firewallEventsAdaptive", []) if zones else []
-    if not events:
-        print(f"No Cloudflare security events in the last {args.minutes} minutes.")
-        return
 
-    for event in events:
-        print(
-            f"{event.get('datetime')} {event.get('action'):10} "
-            f"{event.get('clientIP')} {event.get('clientCountryName')} "
-            f"{event.get('clientRequestHTTPHost')}{event.get('clientRequestPath')} "
-            f"[{event.get('source')}]"
-        )
+def run_preflight(*, build: bool, test_shards: int, concurrency: int | None, keep_going: bool) -> bool:
+    test_jobs = vitest_shard_jobs(test_shards) if test_shards else []
+    jobs = (list(PREFLIGHT_JOBS) if build else []) + test_jobs
+    if not jobs:
+        raise SystemExit("Nothing to run: both --skip-build and --skip-tests were given.")
+    results = run_shell_jobs(jobs, concurrency=max(1, concurrency or len(jobs)), keep_going=keep_going)
+    finished = [job for job in test_jobs if results[job.name].status != "cancelled"]
+    passed = merge_vitest_results(finished) if test_jobs else True
+    return passed and all(result.status == "ok" for result in results.values())
 
 
-def build_parser() -> argparse.ArgumentParser:
-    parser = argparse.ArgumentParser(
-        description="Medora Health Beauty Vercel/Cloudflare ops helper"
+def cmd_preflight(args: argparse.Namespace) -> None:
+    test_shards = 0 if args.skip_tests else args.test_shards
+    passed = run_preflight(
+        build=not args.skip_build,
+        test_shards=test_shards,
+        concurrency=args.concurrency,
+        keep_going=args.keep_going,
     )
-    parser.add_argument("--vercel-token", help="Defaults to VERCEL_TOKEN")
-    parser.add_argument("--vercel-scope", help="Defaults to VERCEL_SCOPE")
-    parser.add_argument("--cf-token", help="Defaults to CLOUDFLARE_API_TOKEN or CF_API_TOKEN")
-    parser.add_argument("--cf-zone-id", help="Defaults to CLOUDFLARE_ZONE_ID or CF_ZONE_ID")
-    parser.add_argument("--cf-zone-name", help=f"Defaults to {DEFAULT_CF_ZONE_NAME}")
+    if not passed:
+        raise SystemExit(1)
 
-    sub = parser.add_subparsers(dest="command", required=True)
 
-    whoami = sub.add_parser("vercel-whoami", help="Verify the Vercel token")
-    whoami.set_defaults(func=cmd_vercel_whoami)
+def vitest_files() -> list[str]:
+    files = {path.relative_to(ROOT).as_posix() for pattern in VITEST_PATTERNS for path in TEST_DIR.rglob(pattern)}
+    return sorted(files)
 
-    deploy = sub.add_parser("vercel-deploy", help="Build locally, then deploy to Vercel")
-    deploy.add_argument("--prod", action=argparse.BooleanOptionalAction, default=True)
-    deploy.add_argument("--skip-build", action="store_true", help="Skip local npm run build verification")
-    deploy.add_argument("--archive", choices=["tgz"], help="Pass through to vercel deploy --archive")
-    deploy.set_defaults(func=cmd_vercel_deploy)
 
-    list_cmd = sub.add_parser("vercel-list", help="List Vercel deployments")
-    list_cmd.add_argument("--project", default=DEFAULT_PROJECT)
-    list_cmd.add_argument("--environment", choices=["production", "preview", "development"])
-    list_cmd.add_argument("--status", help="READY, ERROR, BUILDING, etc.")
-    list_cmd.set_defaults(func=cmd_vercel_list)
+def load_vitest_timings() -> dict[str, float]:
+    try:
+        return json.loads(VITEST_TIMINGS_FILE.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
 
-    build_logs = sub.add_parser("vercel-build-logs", help="Read Vercel build logs for a deployment")
-    build_logs.add_argument("--deployment")
-    build_logs.set_defaults(func=cmd_vercel_build_logs)
 
-    runtime_logs = sub.add_parser("vercel-runtime-logs", help="Tail Vercel runtime logs for a deployment")
-    runtime_logs.add_argument("--deployment")
-    runtime_logs.add_argument("--json", action="store_true")
-    runtime_logs.set_defaults(func=cmd_vercel_runtime_logs)
+def lpt_shards(durations: dict[str, float], count: int) -> list[tuple[float, list[str]]]:
+    # Longest processing time first: each file goes to the least loaded shard.
+    heap: list[tuple[float, int, list[str]]] = [(0.0, index, []) for index in range(count)]
+    for name, duration in sorted(durations.items(), key=lambda pair: (-pair[1], pair[0])):
+        load, index, files = heapq.heappop(heap)
+        files.append(name)
+        heapq.heappush(heap, (load + duration, index, files))
+    return [(load, files) for load, _, files in sorted(heap, key=lambda item: item[1]) if files]
 
-    cf_zone = sub.add_parser("cf-zone", help="Show Cloudflare zone details")
-    cf_zone.set_defaults(func=cmd_cf_zone)
 
-    cf_verify = sub.add_parser("cf-token-verify", help="Verify the Cloudflare API token")
-    cf_verify.set_defaults(func=cmd_cf_token_verify)
+def vitest_shard_jobs(shards: int) -> list[ShellJob]:
+    files = vitest_files()
+    if not files:
+        raise SystemExit(f"No vitest files found under {TEST_DIR.relative_to(ROOT)}/.")
+    timings = load_vitest_timings()
+    known = sorted(timings[name] for name in files if name in timings)
+    # Files without a recorded duration are assumed to be typical ones.
+    typical = known[len(known) // 2] if known else 1.0
+    plan = lpt_shards({name: timings.get(name, typical) for name in files}, max(1, min(shards, len(files))))
 
-    cf_zones = sub.add_parser("cf-zones", help="List Cloudflare zones visible to the token")
-    cf_zones.set_defaults(func=cmd_cf_zones)
+    VITEST_DIR.mkdir(parents=True, exist_ok=True)
+    jobs = []
+    for number, (load, shard_files) in enumerate(plan, start=1):
+        name = f"test-{number}"
+        output = VITEST_DIR / f"{name}.json"
+        output.unlink(missing_ok=True)
+        print(f"{name}: {len(shard_files)} files, ~{load:.1f}s expected", flush=True)
+        # One vitest worker per shard: the shards replace vitest's own worker pool
+        # rather than each starting a pool sized to the CPU count.
+        cmd = [
+            "npx",
+            "vitest",
+            "run",
+            "--maxWorkers=1",
+            "--reporter=dot",
+            "--reporter=json",
+            f"--outputFile.json={output.relative_to(ROOT)}",
+        ]
+        jobs.append(ShellJob(name, cmd + shard_files, files=shard_files))
+    return jobs
 
-    cf_dns = sub.add_parser("cf-dns", help="List Cloudflare DNS records")
-    cf_dns.set_defaults(func=cmd_cf_dns)
 
-    purge = sub.add_parser("cf-purge", help="Purge Cloudflare CDN cache")
-    purge.add_argument("--everything", action="store_true")
-    purge.add_argument("--url", action="append", help="Purge a specific URL. Can be repeated.")
-    purge.set_defaults(func=cmd_cf_purge)
+def merge_vitest_results(jobs: list[ShellJob]) -> bool:
+    timings = load_vitest_timings()
+    totals: collections.Counter[str] = collections.Counter()
+    failures: list[tuple[str, str]] = []
+    missing: list[str] = []
+    for job in jobs:
+        try:
+            report = json.loads((VITEST_DIR / f"{job.name}.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            missing.append(job.name)
+            continue
+        for key in ("numTotalTests", "numPassedTests", "numFailedTests", "numPendingTests"):
+            totals[key] += report.get(key) or 0
+        for result in report.get("testResults") or []:
+            name = Path(os.path.relpath(result["name"], ROOT)).as_posix()
+            if result.get("startTime") and result.get("endTime"):
+                timings[name] = round((result["endTime"] - result["startTime"]) / 1000, 3)
+            failed = [item for item in result.get("assertionResults") or [] if item.get("status") == "failed"]
+            failures.extend((name, item.get("fullName") or item.get("title") or "?") for item in failed)
+            if result.get("status") == "failed" and not failed:
+                failures.append((name, (result.get("message") or "failed to run").strip().splitlines()[0]))
 
-    security = sub.add_parser("cf-security-events", help="Read recent Cloudflare security/firewall events")
-    security.add_argument("--minutes", type=int, default=60)
-    security.add_argument("--limit", type=int, default=20)
-    security.set_defaults(func=cmd_cf_security_events)
+    VITEST_DIR.mkdir(parents=True, exist_ok=True)
+    VITEST_TIMINGS_FILE.write_text(json.dumps(timings, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+    print(
+        f"vitest: {totals['numPassedTests']}/{totals['numTotalTests']} tests passed, "
+        f"{totals['numFailedTests']} failed, {totals['numPendingTests']} skipped across {len(jobs)} shards"
+    )
+    for name, title in failures:
+        print(f"  FAIL {name} > {title}")
+    for name in missing:
+        print(f"  {name} produced no JSON report; see {(PREFLIGHT_DIR / name).relative_to(ROOT)}.log")
+    return not failures and not missing
 
-    return parser
 
+def cmd_test(args: argparse.Namespace) -> None:
+    jobs = vitest_shard_jobs(args.shards)
+    if args.dry_run:
+        for job in jobs:
+            print(f"{job.name}: {' '.join(job.files)}")
+        return
+    results = run_shell_jobs(jobs, concurrency=len(jobs), keep_going=True)
+    passed = merge_vitest_results(jobs)
+    if not passed or any(result.status != "ok" for result in results.values()):
+        raise SystemExit(1)
+
+
+def hashless_name(name: str) -> str:
+    # assets/index-AbCd1234.js -> assets/index.js, so chunks can be compared across builds.
+    return re.sub(r"-[A-Za-z0-9_-]{8}(\.[a-z0-9]+)$", r"\1", name)
+
+
+def compressed_sizes(path: Path) -> dict[str, int | None]:
+    data = path.read_bytes()
+    if path.suffix not in BUNDLE_TEXT_SUFFIXES:
+        return {"raw": len(data), "gzip": None, "brotli": None}
+    return {
+        "raw": len(data),
+        "gzip": len(gzip.compress(data, compresslevel=9, mtime=0)),
+        "brotli": len(brotli.compress(data, quality=11)) if brotli else None,
+    }
+
+
+def chunk_imports(source: str) -> tuple[set[str], set[str]]:
+    static = set(STATIC_IMPORT_RE.findall(source))
+    dynamic = set(DYNAMIC_IMPORT_RE.findall(source))
+    return static, dynamic - static
+
+
+def bundle_entries(dist: Path, sizes: dict[str, dict[str, int | None]]) -> dict[str, dict[str, Any]]:
+    imports: dict[str, tuple[set[str], set[str]]] = {}
+
+    def resolve(base: str, link: str) -> str | None:
+        if urllib.parse.urlsplit(link).netloc:
+            return None
+        name = (
+            link.split("?", 1)[0].lstrip("/")
+            if link.startswith("/")
+            else posixpath.normpath(posixpath.join(posixpath.dirname(base), link))
+        )
+        return name if name in sizes else None
+
+    def edges(name: str) -> tuple[set[str], set[str]]:
+        if name not in imports:
+            static: set[str] = set()
+            dynamic: set[str] = set()
+            if name.endswith(".js"):
+                source = (dist / name).read_text(encoding="utf-8", errors="replace")
+                found_static, found_dynamic = chunk_imports(source)
+                static = {target for link in found_static if (target := resolve(name, link))}
+                dynamic = {target for link in found_dynamic if (target := resolve(name, link))}
+            imports[name] = (static, dynamic)
+        return imports[name]
+
+    def closure(roots: set[str]) -> set[str]:
+        seen, stack = set(roots), list(roots)
+        while stack:
+            for target in edges(stack.pop())[0] - seen:
+                seen.add(target)
+                stack.append(target)
+        return seen
+
+    groups: dict[frozenset[str], list[str]] = collections.defaultdict(list)
+    for page in sorted(name for name in sizes if name.endswith(".html")):
+        parser = AssetLinkParser()
+        parser.feed((dist / page).read_text(encoding="utf-8", errors="replace"))
+        roots = {target for link in parser.links if (target := resolve(page, link))}
+        groups[frozenset(roots)].append(page)
+
+    entries = {}
+    for roots, pages in groups.items():
+        initial = closure(set(roots))
+        lazy_roots = {target for name in initial for target in edges(name)[1]} - initial
+        lazy = closure(lazy_roots) - initial
+        entries[pages[0]] = {
+            "pages": len(pages),
+            "initial": sorted(name for name in initial if name.endswith((".js", ".css"))),
+            "lazy": sorted(name for name in lazy if name.endswith((".js", ".css"))),
+        }
+    return entries
+
+
+def sum_sizes(names: list[str], sizes: dict[str, dict[str, int | None]], suffix: str) -> dict[str, int]:
+    total = {"raw": 0, "gzip": 0, "brotli": 0}
+    for name in names:
+        if name.endswith(suffix):
+            for key in total:
+                total[key] += sizes[name][key] or 0
+    return total
+
+
+def bundle_report(dist: Path = DIST_DIR) -> dict[str, Any]:
+    if not dist.is_dir():
+        raise SystemExit(f"{dist} does not exist; build first.")
+    paths = sorted(path for path in dist.rglob("*") if path.is_file())
+    with ThreadPoolExecutor() as pool:
+        measured = pool.map(compressed_sizes, paths)
+        sizes = {path.relative_to(dist).as_posix(): size for path, size in zip(paths, measured)}
+    entries = bundle_entries(dist, sizes)
+    for entry in entries.values():
+        for kind in ("initial", "lazy"):
+            entry[f"{kind}_js"] = sum_sizes(entry[kind], sizes, ".js")
+            entry[f"{kind}_css"] = sum_sizes(entry[kind], sizes, ".css")
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "brotli": brotli is not None,
+        "files": sizes,
+        "entries": entries,
+        "totals": {suffix[1:]: sum_sizes(list(sizes), sizes, suffix) for suffix in (".js", ".css")},
+    }
+
+
+def bundle_metric(report: dict[str, Any], baseline: dict[str, Any] | None) -> str:
+    # Only compare brotli sizes when both reports were measured with brotli.
+    return "brotli" if report["brotli"] and (baseline is None or baseline.get("brotli")) else "gzip"
+
+
+def print_bundle_report(report: dict[str, Any], baseline: dict[str, Any] | None, top: int) -> None:
+    metric = bundle_metric(report, baseline)
+
+    def size_metric(sizes: dict[str, int | None]) -> int:
+        return sizes.get(metric) or 0
+
+    def delta(current: int, previous: int | None) -> str:
+        if previous is None:
+            return ""
+        change = current - previous
+        return f" ({'+' if change >= 0 else ''}{format_bytes(change)})" if change else " (=)"
+
+    def previous_total(kind: str) -> int | None:
+        return size_metric(baseline["totals"][kind]) if baseline else None
+
+    for kind in ("js", "css"):
+        total = report["totals"][kind]
+        print(
+            f"{kind.upper():4} {format_bytes(total['raw']):>9} raw  "
+            f"{format_bytes(size_metric(total)):>9} {metric}{delta(size_metric(total), previous_total(kind))}"
+        )
+
+    print(f"\nEntry points (initial / lazy, {metric})")
+    old_entries = (baseline or {}).get("entries") or {}
+    for page, entry in sorted(report["entries"].items(), key=lambda pair: -size_metric(pair[1]["initial_js"])):
+        old = old_entries.get(page)
+        label = page if entry["pages"] == 1 else f"{page} (+{entry['pages'] - 1} pages)"
+        initial_js = size_metric(entry["initial_js"])
+        print(
+            f"  {label:44} JS {format_bytes(initial_js):>9}"
+            f"{delta(initial_js, size_metric(old['initial_js']) if old else None)}  "
+            f"CSS {format_bytes(size_metric(entry['initial_css'])):>9}  "
+            f"lazy JS {format_bytes(size_metric(entry['lazy_js'])):>9}"
+        )
+
+    chunks = {
+        hashless_name(name): size_metric(sizes)
+        for name, sizes in report["files"].items()
+        if name.endswith((".js", ".css"))
+    }
+    print(f"\nLargest chunks ({metric})")
+    for name, size in heapq.nlargest(top, chunks.items(), key=lambda pair: pair[1]):
+        print(f"  {format_bytes(size):>9}  {name}")
+    if baseline:
+        old_chunks = {
+            hashless_name(name): size_metric(sizes)
+            for name, sizes in baseline["files"].items()
+            if name.endswith((".js", ".css"))
+        }
+        changes = {name: chunks.get(name, 0) - old_chunks.get(name, 0) for name in set(chunks) | set(old_chunks)}
+        grown = [pair for pair in heapq.nlargest(top, changes.items(), key=lambda pair: abs(pair[1])) if pair[1]]
+        if grown:
+            print(f"\nChanged vs the last production deploy ({baseline.get('created')})")
+            for name, change in grown:
+                state = " (new)" if name not in old_chunks else " (removed)" if name not in chunks else ""
+                print(f"  {'+' if change > 0 else ''}{format_bytes(change):>9}  {name}{state}")
+
+
+def bundle_budget_failures(
+    report: dict[str, Any], baseline: dict[str, Any] | None, *, js_growth: float, css_growth: float
+) -> list[str]:
+    if baseline is None:
+        return []
+    metric = bundle_metric(report, baseline)
+    failures = []
+    for kind, limit in (("js", js_growth), ("css", css_growth)):
+        growth = (report["totals"][kind][metric] or 0) - (baseline["totals"][kind][metric] or 0)
+        if limit >= 0 and growth > limit * 1024:
+            failures.append(f"{kind.upper()} grew by {format_bytes(growth)} {metric}; the budget is {limit:g}KB")
+    return failures
+
+
+def load_bundle_report(path: Path) -> dict[str, Any] | None:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def check_bundle_budget(args: argparse.Namespace) -> dict[str, Any]:
+    report = bundle_report(DIST_DIR)
+    BUNDLE_REPORT_FILE.parent.mkdir(parents=True, exist_ok=True)
+    BUNDLE_REPORT_FILE.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    baseline = load_bundle_report(DEPLOYED_BUNDLE_FILE)
+    print_bundle_report(report, baseline, args.top)
+    failures = bundle_budget_failures(
+        report, baseline, js_growth=args.js_budget_kb, css_growth=args.css_budget_kb
+    )
+    if failures:
+        for failure in failures:
+            print(f"Bundle budget exceeded: {failure}", file=sys.stderr)
+        raise SystemExit("Bundle budget exceeded; pass --no-bundle-budget or raise the budget to deploy anyway.")
+    return report
+
+
+def cmd_bundle_report(args: argparse.Namespace) -> None:
+    if args.format == "json":
+        print(json.dumps(bundle_report(DIST_DIR), indent=2))
+        return
+    check_bundle_budget(args)
+
+
+def cmd_vercel_deploy(args: argparse.Namespace) -> None:
+    build_dist(args)
+    bundle = check_bundle_budget(args) if args.bundle_budget and DIST_DIR.is_dir() else None
+
+    with TRACE.span("hash build output"):
+        files = build_manifest(DIST_DIR) if DIST_DIR.exists() else None
+        if files is not None:
+            write_manifest(BUILD_MANIFEST_FILE, files)
+
+    cmd = vercel_base_args(args) + ["deploy", "--yes"]
+    if args.prod:
+        cmd.append("--prod")
+    if args.archive:
+        cmd += ["--archive", args.archive]
+    output = run(cmd, capture=True)
+    deployment = remember_deployment(output)
+
+    if files is None:
+        print("\nNo dist/ build output; skipping the content-hash manifest and cache purge.")
+    elif args.prod:
+        with TRACE.span("purge changed files"):
+            purge_changed_files(args, files, deployment)
+    if bundle is not None and args.prod:
+        DEPLOYED_BUNDLE_FILE.write_text(json.dumps(bundle, indent=2) + "\n", encoding="utf-8")
+
+
+def cmd_vercel_list(args: argparse.Namespace) -> None:
+    project = args.project or env("VERCEL_PROJECT", default=DEFAULT_PROJECT)
+
+    def api_call() -> None:
+        data = vercel_request(
+            args,
+            "GET",
+            "/v6/deployments",
+            query={
+                "projectId": vercel_project_id(args, project),
+                "target": args.environment,
+                "state": args.status.upper() if args.status else None,
+                "limit": args.limit,
+            },
+        )
+        deployments = data.get("deployments") or []
+        if not deployments:
+            print(f"No deployments found for {project}.")
+            return
+        for deployment in deployments:
+            print(
+                f"{format_ms(deployment.get('created'))} {deployment.get('state') or '-':9} "
+                f"{deployment.get('target') or 'preview':11} https://{deployment.get('url')}"
+            )
+
+    cli_args = ["ls", project]
+    if args.environment:
+        cli_args += ["--environment", args.environment]
+    if args.status:
+        cli_args += ["--status", args.status]
+    run_vercel(args, api_call, cli_args)
+
+
+def cmd_vercel_whoami(args: argparse.Namespace) -> None:
+    def api_call() -> None:
+        user = vercel_request(args, "GET", "/v2/user").get("user") or {}
+        print(user.get("username") or user.get("email") or "unknown")
+
+    run_vercel(args, api_call, ["whoami"])
+
+
+def cmd_vercel_build_logs(args: argparse.Namespace) -> None:
+    deployment = get_deployment_arg(args.deployment)
+
+    def api_call() -> None:
+        deployment_id = vercel_deployment(args, deployment)["id"]
+        events = vercel_request(
+            args,
+            "GET",
+            f"/v3/deployments/{deployment_id}/events",
+            query={"builds": 1, "direction": "forward", "limit": -1},
+        )
+        for event in events:
+            payload = event.get("payload") or {}
+            text = payload.get("text", event.get("text"))
+            if text is not None:
+                print(f"{format_ms(event.get('created'))} {text}")
+
+    run_vercel(args, api_call, ["inspect", deployment, "--logs"])
+
+
+def log_status(entry: dict[str, Any]) -> int | None:
+    proxy = entry.get("proxy") or {}
+    value = entry.get("responseStatusCode") or entry.get("statusCode") or proxy.get("statusCode")
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def log_path(entry: dict[str, Any]) -> str:
+    proxy = entry.get("proxy") or {}
+    return entry.get("requestPath") or entry.get("path") or proxy.get("path") or ""
+
+
+def log_duration(entry: dict[str, Any]) -> float | None:
+    for value in (entry.get("durationMs"), entry.get("duration"), (entry.get("proxy") or {}).get("duration")):
+        if isinstance(value, (int, float)):
+            return float(value)
+    return None
+
+
+def format_runtime_log(entry: dict[str, Any]) -> str:
+    target = f"{entry.get('domain') or ''}{log_path(entry)}"
+    parts = [entry.get("requestMethod"), log_status(entry), target]
+    request = " ".join(str(part) for part in parts if part)
+    duration = log_duration(entry)
+    if duration is not None:
+        request += f" {duration:.0f}ms"
+    message = (entry.get("message") or "").rstrip()
+    return f"{format_ms(entry.get('timestampInMs'))} {entry.get('level') or '-':7} {request} {message}".rstrip()
+
+
+def status_matcher(spec: str) -> Callable[[int | None], bool]:
+    # "500", "5xx" or a comma-separated mix such as "429,5xx".
+    exact: set[int] = set()
+    classes: set[int] = set()
+    for part in spec.lower().split(","):
+        part = part.strip()
+        if re.fullmatch(r"[1-5]xx", part):
+            classes.add(int(part[0]))
+        elif part.isdigit():
+            exact.add(int(part))
+        elif part:
+            raise SystemExit(f"Invalid --status value {part!r}; use e.g. 500, 5xx or 429,5xx.")
+    return lambda status: status is not None and (status in exact or status // 100 in classes)
+
+
+def runtime_log_filter(args: argparse.Namespace) -> Callable[[dict[str, Any] | None], bool] | None:
+    checks: list[Callable[[dict[str, Any]], bool]] = []
+    if args.status:
+        match_status = status_matcher(args.status)
+        checks.append(lambda entry: match_status(log_status(entry)))
+    if args.path:
+        pattern = re.compile(args.path)
+        checks.append(lambda entry: bool(pattern.search(log_path(entry))))
+    if args.min_duration is not None:
+        checks.append(lambda entry: (log_duration(entry) or 0.0) >= args.min_duration)
+    if args.level:
+        checks.append(lambda entry: (entry.get("level") or "").lower() == args.level.lower())
+    if not checks:
+        return None
+    return lambda entry: entry is not None and all(check(entry) for check in checks)
+
+
+class RingBuffer:
+    """Bounded hand-off between a reader thread and the consumer; drops oldest lines when full."""
+
+    def __init__(self, size: int) -> None:
+        self._items: collections.deque[str] = collections.deque(maxlen=size)
+        self._ready = threading.Condition()
+        self._done = False
+        self._error: BaseException | None = None
+        self.dropped = 0
+
+    def feed(self, lines: Iterator[str]) -> None:
+        def pump() -> None:
+            try:
+                for line in lines:
+                    with self._ready:
+                        if len(self._items) == self._items.maxlen:
+                            self.dropped += 1
+                        self._items.append(line)
+                        self._ready.notify()
+            except BaseException as error:
+                self._error = error
+            finally:
+                with self._ready:
+                    self._done = True
+                    self._ready.notify()
+
+        threading.Thread(target=pump, daemon=True).start()
+
+    def __iter__(self) -> Iterator[str]:
+        return self.lines()
+
+    def lines(self, *, deadline: float | None = None) -> Iterator[str]:
+        while True:
+            with self._ready:
+                while not self._items and not self._done:
+                    timeout = None if deadline is None else deadline - time.monotonic()
+                    if timeout is not None and timeout <= 0:
+                        return
+                    self._ready.wait(timeout)
+                if not self._items:
+                    break
+                line = self._items.popleft()
+            yield line
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+        if self._error:
+            raise self._error
+
+
+def stream_command_lines(cmd: list[str], *, cwd: Path = ROOT) -> Iterator[str]:
+    print(f"$ {printable_cmd(cmd)}", file=sys.stderr, flush=True)
+    started = time.perf_counter()
+    process = subprocess.Popen(cmd, cwd=cwd, text=True, stdout=subprocess.PIPE, bufsize=1)
+    TRACE.complete("spawn " + cmd[0], "subprocess", started, time.perf_counter(), command=printable_cmd(cmd))
+    assert process.stdout is not None
+    try:
+        for line in process.stdout:
+            yield line.rstrip("\n")
+    finally:
+        if process.poll() is None:
+            process.terminate()
+        process.wait()
+    if process.returncode:
+        raise SystemExit(process.returncode)
+
+
+def api_runtime_log_lines(args: argparse.Namespace, info: dict[str, Any]) -> Iterator[str]:
+    url = vercel_url(args, f"/v1/projects/{info['projectId']}/deployments/{info['id']}/runtime-logs")
+    with HTTP.stream("GET", url, headers=vercel_headers(args)) as response:
+        if response.status >= 400:
+            raise ApiError("Vercel", response.status, response.read().decode("utf-8", "replace"))
+        for raw_line in response:
+            line = raw_line.decode("utf-8", errors="replace").strip()
+            if line:
+                yield line
+
+
+def runtime_log_lines(args: argparse.Namespace, deployment: str) -> Iterator[str]:
+    if not args.vercel_cli and not env("OPS_VERCEL_CLI"):
+        try:
+            info = vercel_deployment(args, deployment)
+        except OSError as error:
+            print(f"Vercel API request failed ({error}); falling back to the Vercel CLI.", file=sys.stderr)
+        else:
+            yield from api_runtime_log_lines(args, info)
+            return
+    yield from stream_command_lines(vercel_base_args(args) + ["logs", deployment, "--json"])
+
+
+def parse_log_line(line: str) -> dict[str, Any] | None:
+    try:
+        entry = json.loads(line)
+    except json.JSONDecodeError:
+        return None
+    return entry if isinstance(entry, dict) else None
+
+
+def deployment_label(deployment: str) -> str:
+    host = re.sub(r"^https?://", "", deployment).split("/", 1)[0]
+    return host.split(".", 1)[0]
+
+
+def merge_runtime_logs(
+    args: argparse.Namespace,
+    deployments: list[str],
+    *,
+    window: float,
+    deadline: float | None = None,
+) -> Iterator[tuple[str, str, dict[str, Any] | None]]:
+    # k-way merge of live streams. An entry is released once every still-open
+    # stream has reached its timestamp, or after it has waited `window` seconds.
+    heap: list[tuple[float, int, float, str, str, dict[str, Any] | None]] = []
+    latest: dict[str, float] = {}
+    open_streams = set()
+    errors: list[BaseException] = []
+    ready = threading.Condition()
+    sequence = itertools.count()
+
+    def pump(deployment: str, label: str) -> None:
+        try:
+            for line in runtime_log_lines(args, deployment):
+                entry = parse_log_line(line)
+                timestamp = float((entry or {}).get("timestampInMs") or time.time() * 1000)
+                with ready:
+                    latest[label] = max(latest.get(label, 0.0), timestamp)
+                    heapq.heappush(heap, (timestamp, next(sequence), time.monotonic(), label, line, entry))
+                    ready.notify()
+        except BaseException as error:
+            errors.append(error)
+        finally:
+            with ready:
+                open_streams.discard(label)
+                ready.notify()
+
+    for deployment in deployments:
+        label = deployment_label(deployment)
+        open_streams.add(label)
+        threading.Thread(target=pump, args=(deployment, label), daemon=True).start()
+
+    while True:
+        with ready:
+            if not heap and not open_streams:
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+            ready.wait(0.1)
+            watermark = min((latest.get(label, float("-inf")) for label in open_streams), default=float("inf"))
+            now = time.monotonic()
+            released = []
+            while heap and (heap[0][0] <= watermark or now - heap[0][2] >= window):
+                released.append(heapq.heappop(heap))
+        for _, _, _, label, line, entry in released:
+            yield label, line, entry
+    if errors:
+        raise errors[0]
+
+
+def tagged_log_lines(
+    args: argparse.Namespace, deployments: list[str], *, deadline: float | None = None
+) -> tuple[Iterator[tuple[str, str, dict[str, Any] | None]], RingBuffer | None]:
+    if len(deployments) > 1:
+        merged = merge_runtime_logs(args, deployments, window=args.reorder_window, deadline=deadline)
+        return merged, None
+    buffer = RingBuffer(args.buffer)
+    buffer.feed(runtime_log_lines(args, deployments[0]))
+    label = deployment_label(deployments[0])
+    lines = ((label, line, parse_log_line(line)) for line in buffer.lines(deadline=deadline))
+    return lines, buffer
+
+
+def cmd_vercel_runtime_logs(args: argparse.Namespace) -> None:
+    deployments = args.deployment or [get_deployment_arg(None)]
+    tag = len(deployments) > 1
+    matches = runtime_log_filter(args)
+    lines, buffer = tagged_log_lines(args, deployments)
+    tee = open(args.tee, "a", encoding="utf-8") if args.tee else None
+    try:
+        for label, line, entry in lines:
+            if matches and not matches(entry):
+                continue
+            if tag and entry is not None:
+                entry = {"deployment": label, **entry}
+                line = json.dumps(entry, ensure_ascii=False)
+            if args.json or entry is None:
+                print(f"[{label}] {line}" if tag and entry is None else line, flush=True)
+            else:
+                print((f"[{label}] " if tag else "") + format_runtime_log(entry), flush=True)
+            if tee:
+                tee.write(line + "\n")
+                tee.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if tee:
+            tee.close()
+        if buffer and buffer.dropped:
+            print(f"Dropped {buffer.dropped} log lines while the reader was behind.", file=sys.stderr)
+
+
+class LatencyHistogram:
+    """Log-bucketed histogram (HDR-style): ~1% relative error, mergeable by adding buckets."""
+
+    def __init__(self, precision: float = 0.01) -> None:
+        self.base = math.log1p(precision)
+        self.buckets: dict[int, int] = {}
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        bucket = math.floor(math.log(max(value, 0.01)) / self.base)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def merge(self, other: LatencyHistogram) -> None:
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += other.count
+        self.max = max(self.max, other.max)
+
+    def percentile(self, pct: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(pct / 100 * self.count))
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                # Report the bucket midpoint, capped by the true maximum.
+                return min(self.max, math.exp((bucket + 0.5) * self.base))
+        return self.max
+
+
+def api_route_templates(api_dir: Path = ROOT / "api") -> list[tuple[re.Pattern[str], str]]:
+    templates: list[tuple[int, int, re.Pattern[str], str]] = []
+    for path in api_dir.rglob("*.js"):
+        parts = path.relative_to(api_dir).with_suffix("").parts
+        if any(part.startswith("_") for part in parts):
+            continue
+        if parts[-1] == "index":
+            parts = parts[:-1]
+        regex = ""
+        template = "/api"
+        static = 0
+        catch_all = 0
+        for part in parts:
+            if part.startswith("[...") and part.endswith("]"):
+                regex += r"(?:/.*)?"
+                template += f"/*{part[4:-1]}"
+                catch_all = 1
+            elif part.startswith("[") and part.endswith("]"):
+                regex += r"/[^/]+"
+                template += f"/:{part[1:-1]}"
+            else:
+                regex += "/" + re.escape(part)
+                template += f"/{part}"
+                static += 1
+        templates.append((catch_all, -static, re.compile(f"^/api{regex}/?$"), template))
+    # Most specific first: exact files before catch-alls, more static segments first.
+    templates.sort(key=lambda item: (item[0], item[1], -len(item[3])))
+    return [(pattern, template) for _, _, pattern, template in templates]
+
+
+def route_template(path: str, templates: list[tuple[re.Pattern[str], str]]) -> str:
+    path = urllib.parse.unquote(path.split("?", 1)[0]) or "/"
+    path = re.sub(r"^/admin/api/", "/api/admin/", path)
+    if path.startswith("/api/"):
+        for pattern, template in templates:
+            if pattern.match(path):
+                return template
+        return "/api/(unknown)"
+    segments = [segment for segment in path.split("/") if segment]
+    if not segments:
+        return "/"
+    if "." in segments[-1]:
+        extension = segments[-1].rsplit(".", 1)[1]
+        return f"/{segments[0]}/*.{extension}" if len(segments) > 1 else f"/*.{extension}"
+    return f"/{segments[0]}" + ("/*" if len(segments) > 1 else "")
+
+
+@dataclass
+class RouteStats:
+    histogram: LatencyHistogram = field(default_factory=LatencyHistogram)
+    requests: int = 0
+    errors: int = 0
+
+
+def collect_route_latency(
+    entries: Iterator[dict[str, Any] | None],
+    templates: list[tuple[re.Pattern[str], str]],
+    *,
+    since_ms: float | None,
+) -> dict[str, dict[str, RouteStats]]:
+    # Grouped by the "deployment" tag that merged runtime-log streams carry.
+    stats: dict[str, dict[str, RouteStats]] = {}
+    for entry in entries:
+        if entry is None or not log_path(entry):
+            continue
+        if since_ms and (entry.get("timestampInMs") or 0) < since_ms:
+            continue
+        group = stats.setdefault(entry.get("deployment") or "", {})
+        route = group.setdefault(route_template(log_path(entry), templates), RouteStats())
+        route.requests += 1
+        status = log_status(entry)
+        if status is not None and status >= 500:
+            route.errors += 1
+        duration = log_duration(entry)
+        if duration is not None:
+            route.histogram.add(duration)
+    return stats
+
+
+def print_route_latency(stats: dict[str, RouteStats], *, top: int) -> None:
+    overall = RouteStats()
+    for route_stats in stats.values():
+        overall.histogram.merge(route_stats.histogram)
+        overall.requests += route_stats.requests
+        overall.errors += route_stats.errors
+    print(f"{'route':44} {'count':>7} {'err%':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+    ranked = sorted(stats.items(), key=lambda item: item[1].histogram.percentile(95), reverse=True)
+    for route, route_stats in [*ranked[:top], ("(all routes)", overall)]:
+        histogram = route_stats.histogram
+        print(
+            f"{route[:44]:44} {route_stats.requests:>7} {route_stats.errors / route_stats.requests:>6.1%} "
+            f"{histogram.percentile(50):>6.0f}ms {histogram.percentile(95):>6.0f}ms "
+            f"{histogram.percentile(99):>6.0f}ms {histogram.max:>6.0f}ms"
+        )
+
+
+def cmd_log_latency(args: argparse.Namespace) -> None:
+    since_ms = (time.time() - args.minutes * 60) * 1000 if args.minutes else None
+    templates = api_route_templates()
+    if args.input:
+        entries: Iterator[dict[str, Any] | None] = (
+            parse_log_line(line) for source in args.input for line in read_lines(source)
+        )
+    else:
+        deployments = args.deployment or [get_deployment_arg(None)]
+        print(f"Collecting runtime logs from {', '.join(deployments)} for {args.seconds}s...", file=sys.stderr)
+        lines, _ = tagged_log_lines(args, deployments, deadline=time.monotonic() + args.seconds)
+        tag = len(deployments) > 1
+        entries = ({"deployment": label, **entry} if tag and entry else entry for label, _, entry in lines)
+
+    groups = collect_route_latency(entries, templates, since_ms=since_ms)
+    if not groups:
+        print("No request log entries in the window.")
+    for label, stats in sorted(groups.items()):
+        if label:
+            print(f"\n== {label} ==")
+        print_route_latency(stats, top=args.top)
+
+
+def cf_response(
+    method: str,
+    path: str,
+    *,
+    token: str,
+    body: dict[str, Any] | None = None,
+    headers: dict[str, str] | None = None,
+    api_base: str = CF_API_BASE,
+    idempotent: bool | None = None,
+) -> HttpResponse:
+    data = None
+    request_headers = {
+        "Authorization": f"Bearer {token}",
+        "Accept": "application/json",
+        "Content-Type": "application/json",
+        **(headers or {}),
+    }
+    if body is not None:
+        data = json.dumps(body).encode("utf-8")
+
+    budget = cf_budget(token)
+    try:
+        response = HTTP.request(
+            method,
+            api_base + path,
+            headers=request_headers,
+            body=data,
+            idempotent=idempotent,
+            before_send=budget.take if budget else None,
+        )
+    except OSError as error:
+        raise SystemExit(f"Cloudflare API request failed: {error}") from error
+    if response.status == 429 and budget:
+        # Cloudflare says the token is over its limit: make other processes wait too.
+        budget.drain()
+    if response.status >= 400:
+        raise ApiError("Cloudflare", response.status, response.text())
+    return response
+
+
+def cf_request(
+    method: str,
+    path: str,
+    *,
+    token: str,
+    body: dict[str, Any] | None = None,
+    idempotent: bool | None = None,
+) -> dict[str, Any]:
+    return cf_response(method, path, token=token, body=body, idempotent=idempotent).json()
+
+
+def token_identity(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()[:16]
+
+
+def cache_path(token: str, name: str) -> Path:
+    digest = hashlib.sha256(name.encode("utf-8")).hexdigest()[:32]
+    return CACHE_DIR / token_identity(token) / f"{digest}.json"
+
+
+def cache_read(token: str, name: str) -> dict[str, Any] | None:
+    path = cache_path(token, name)
+    if not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def cache_write(token: str, name: str, data: Any, etag: str | None = None) -> None:
+    path = cache_path(token, name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    entry = {"name": name, "stored": time.time(), "etag": etag, "data": data}
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(entry), encoding="utf-8")
+    tmp.replace(path)
+
+
+def cache_invalidate(token: str | None, match: str | None = None) -> int:
+    roots = [CACHE_DIR / token_identity(token)] if token else [CACHE_DIR]
+    removed = 0
+    for root in roots:
+        for path in root.rglob("*.json") if root.exists() else []:
+            if match:
+                entry = json.loads(path.read_text(encoding="utf-8"))
+                if match not in entry.get("name", ""):
+                    continue
+            path.unlink()
+            removed += 1
+    return removed
+
+
+def cf_cached_get(args: argparse.Namespace, path: str, *, ttl: float, name: str | None = None) -> Any:
+    # Read-only metadata keyed by token identity, never by the token itself.
+    token = cf_token(args)
+    name = name or path
+    entry = None if args.refresh else cache_read(token, name)
+    if entry and time.time() - entry["stored"] < ttl:
+        return entry["data"]
+
+    headers = {"If-None-Match": entry["etag"]} if entry and entry.get("etag") else None
+    response = cf_response("GET", path, token=token, headers=headers)
+    if response.status == 304 and entry:
+        cache_write(token, name, entry["data"], entry.get("etag"))
+        return entry["data"]
+    data = response.json()
+    cache_write(token, name, data, response.headers.get("etag"))
+    return data
+
+
+def cf_token(args: argparse.Namespace) -> str:
+    return args.cf_token or require_env("CLOUDFLARE_API_TOKEN", "CF_API_TOKEN")
+
+
+ZONE_IDS: dict[tuple[str, str], str] = {}
+
+
+def cf_zone_id(args: argparse.Namespace) -> str:
+    explicit = args.cf_zone_id or env("CLOUDFLARE_ZONE_ID", "CF_ZONE_ID")
+    if explicit:
+        return explicit
+
+    zone_name = args.cf_zone_name or env("CLOUDFLARE_ZONE_NAME", default=DEFAULT_CF_ZONE_NAME)
+    memo_key = (token_identity(cf_token(args)), zone_name)
+    if memo_key in ZONE_IDS and not args.refresh:
+        return ZONE_IDS[memo_key]
+    query = urllib.parse.urlencode({"name": zone_name})
+    data = cf_cached_get(args, f"/zones?{query}", ttl=ZONE_ID_TTL, name=f"zone-id:{zone_name}")
+    zones = data.get("result") or []
+    if not zones:
+        raise SystemExit(f"Could not find Cloudflare zone for {zone_name}. Set CF_ZONE_ID.")
+    ZONE_IDS[memo_key] = zones[0]["id"]
+    return ZONE_IDS[memo_key]
+
+
+class SharedTokenBucket:
+    """Token bucket stored in a file so every ops process on the machine shares it."""
+
+    def __init__(self, path: Path, capacity: float, window: float) -> None:
+        self.path = path
+        self.capacity = capacity
+        self.rate = capacity / window
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def _locked(self) -> Iterator[dict[str, float]]:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(self.path.with_suffix(".lock"), "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                state = json.loads(self.path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                state = {"tokens": self.capacity, "updated": time.time(), "taken": 0}
+            now = time.time()
+            elapsed = max(0.0, now - state["updated"])
+            state["tokens"] = min(self.capacity, state["tokens"] + elapsed * self.rate)
+            state["updated"] = now
+            yield state
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(state), encoding="utf-8")
+            tmp.replace(self.path)
+
+    def take(self) -> float:
+        waited = 0.0
+        while True:
+            with self._locked() as state:
+                if state["tokens"] >= 1:
+                    state["tokens"] -= 1
+                    state["taken"] += 1
+                    return waited
+                delay = (1 - state["tokens"]) / self.rate
+            if not waited and delay >= 1:
+                print(f"Cloudflare request budget is exhausted; waiting {delay:.1f}s...", file=sys.stderr)
+            with TRACE.span("shared rate limit", "http", seconds=round(delay, 3)):
+                time.sleep(delay)
+            waited += delay
+
+    def drain(self) -> None:
+        with self._locked() as state:
+            state["tokens"] = min(state["tokens"], 0.0)
+
+    def status(self) -> dict[str, float]:
+        with self._locked() as state:
+            return dict(state)
+
+    def reset(self) -> None:
+        with self._locked() as state:
+            state["tokens"] = self.capacity
+
+
+CF_BUDGETS: dict[str, SharedTokenBucket] = {}
+
+
+def cf_budget(token: str) -> SharedTokenBucket | None:
+    capacity = float(env("OPS_CF_BUDGET", default=str(CF_BUDGET_REQUESTS)))
+    if capacity <= 0:
+        return None
+    identity = token_identity(token)
+    bucket = CF_BUDGETS.get(identity)
+    if bucket is None or bucket.capacity != capacity:
+        bucket = CF_BUDGETS[identity] = SharedTokenBucket(
+            RATE_LIMIT_DIR / f"{identity}.json", capacity, CF_BUDGET_WINDOW
+        )
+    return bucket
+
+
+def cmd_cf_budget(args: argparse.Namespace) -> None:
+    bucket = cf_budget(cf_token(args))
+    if bucket is None:
+        print("The shared Cloudflare request budget is disabled (OPS_CF_BUDGET=0).")
+        return
+    if args.reset:
+        bucket.reset()
+    state = bucket.status()
+    missing = bucket.capacity - state["tokens"]
+    print(
+        f"{state['tokens']:.0f} of {bucket.capacity:.0f} Cloudflare requests available "
+        f"(refills {bucket.rate * 60:.0f}/min; full in {missing / bucket.rate:.0f}s)"
+    )
+    print(f"{state['taken']} requests counted in {bucket.path.relative_to(ROOT)}")
+
+
+def cmd_cf_metadata_cache_clear(args: argparse.Namespace) -> None:
+    token = None if args.all else cf_token(args)
+    removed = cache_invalidate(token, args.match)
+    print(f"Removed {removed} cached Cloudflare metadata entries.")
+
+
+def cmd_cf_zone(args: argparse.Namespace) -> None:
+    zone_id = cf_zone_id(args)
+    data = cf_cached_get(args, f"/zones/{zone_id}", ttl=args.cache_ttl)
+    print(json.dumps(data.get("result", data), indent=2, ensure_ascii=False))
+
+
+def cmd_cf_token_verify(args: argparse.Namespace) -> None:
+    token = cf_token(args)
+    data = cf_request("GET", "/user/tokens/verify", token=token)
+    result = data.get("result") or {}
+    status = result.get("status") or "unknown"
+    token_id = result.get("id") or "unknown"
+    print(f"Cloudflare token verified: status={status} id={token_id}")
+
+
+def cmd_cf_zones(args: argparse.Namespace) -> None:
+    token = cf_token(args)
+    data = cf_request("GET", "/zones?per_page=100", token=token)
+    zones = data.get("result") or []
+    if not zones:
+        print("No Cloudflare zones visible to this token.")
+        return
+    for zone in zones:
+        print(f"{zone.get('name')} {zone.get('id')} status={zone.get('status')}")
+
+
+def list_dns_records(args: argparse.Namespace, zone_id: str) -> list[dict[str, Any]]:
+    def page(number: int) -> dict[str, Any]:
+        query = urllib.parse.urlencode({"per_page": DNS_PAGE_SIZE, "page": number})
+        return cf_cached_get(args, f"/zones/{zone_id}/dns_records?{query}", ttl=args.cache_ttl)
+
+    first = page(1)
+    total_pages = int((first.get("result_info") or {}).get("total_pages") or 1)
+    records = list(first.get("result") or [])
+    if total_pages > 1:
+        with ThreadPoolExecutor(max_workers=min(8, total_pages - 1)) as pool:
+            for data in pool.map(page, range(2, total_pages + 1)):
+                records.extend(data.get("result") or [])
+    return records
+
+
+def cmd_cf_dns(args: argparse.Namespace) -> None:
+    zone_id = cf_zone_id(args)
+    records = list_dns_records(args, zone_id)
+    if args.json:
+        fields = ["type", "name", "content", "ttl", "proxied", "priority", "comment"]
+        records = [{key: record[key] for key in fields if record.get(key) is not None} for record in records]
+        print(json.dumps(records, indent=2, ensure_ascii=False))
+        return
+    for record in records:
+        proxied = "proxied" if record.get("proxied") else "dns-only"
+        print(f"{record.get('type'):6} {record.get('name'):32} {record.get('content')} ({proxied})")
+    print(f"{len(records)} records")
+
+
+def dns_record_label(record: dict[str, Any]) -> str:
+    proxied = {True: " (proxied)", False: " (dns-only)"}.get(record.get("proxied"), "")
+    return f"{record['type']:6} {record['name']:32} {record['content']}{proxied}"
+
+
+def load_dns_records(path: Path, zone_name: str) -> list[dict[str, Any]]:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as error:
+        raise SystemExit(f"Could not read {path}: {error}") from error
+    records = data.get("records") if isinstance(data, dict) else data
+    if not isinstance(records, list):
+        raise SystemExit(f"{path} must contain a list of DNS records.")
+
+    desired = []
+    for index, record in enumerate(records, start=1):
+        missing = [key for key in ("type", "name", "content") if key not in record]
+        if missing:
+            raise SystemExit(f"DNS record {index} in {path} is missing {', '.join(missing)}.")
+        name = str(record["name"]).rstrip(".").lower()
+        if name == "@":
+            name = zone_name
+        elif name != zone_name and not name.endswith("." + zone_name):
+            name = f"{name}.{zone_name}"
+        desired.append({**record, "type": str(record["type"]).upper(), "name": name})
+    return desired
+
+
+def diff_dns_records(
+    existing: list[dict[str, Any]], desired: list[dict[str, Any]], *, prune: bool
+) -> tuple[list[dict[str, Any]], list[tuple[dict[str, Any], dict[str, Any]]], list[dict[str, Any]]]:
+    # Records are managed per (type, name): every record of a type/name listed in
+    # the file is reconciled, other records are left alone unless --prune is set.
+    def key(record: dict[str, Any]) -> tuple[str, str]:
+        return record["type"].upper(), record["name"].lower()
+
+    current: dict[tuple[str, str], list[dict[str, Any]]] = collections.defaultdict(list)
+    for record in existing:
+        current[key(record)].append(record)
+
+    posts: list[dict[str, Any]] = []
+    patches: list[tuple[dict[str, Any], dict[str, Any]]] = []
+    deletes: list[dict[str, Any]] = []
+    wanted: dict[tuple[str, str], list[dict[str, Any]]] = collections.defaultdict(list)
+    for record in desired:
+        wanted[key(record)].append(record)
+
+    for group, records in wanted.items():
+        available = current.pop(group, [])
+        unmatched = []
+        for record in records:
+            same = next((item for item in available if item["content"] == record["content"]), None)
+            if same is None:
+                unmatched.append(record)
+                continue
+            available.remove(same)
+            changes = {field: value for field, value in record.items() if same.get(field) != value}
+            if changes:
+                patches.append((same, changes))
+        for record in unmatched:
+            if available:
+                old = available.pop(0)
+                patches.append((old, {field: value for field, value in record.items() if old.get(field) != value}))
+            else:
+                posts.append(record)
+        deletes.extend(available)
+    if prune:
+        deletes.extend(record for records in current.values() for record in records)
+    return posts, patches, deletes
+
+
+def dns_batches(
+    deletes: list[dict[str, Any]],
+    patches: list[tuple[dict[str, Any], dict[str, Any]]],
+    posts: list[dict[str, Any]],
+    size: int,
+) -> list[list[tuple[str, str, dict[str, Any]]]]:
+    # Each batch call is atomic, so keep a (type, name) group's deletes, patches and
+    # posts together; only a group bigger than one batch is split across calls.
+    groups: dict[str, list[tuple[str, str, dict[str, Any]]]] = {}
+
+    def add(record: dict[str, Any], kind: str, operation: dict[str, Any]) -> None:
+        group = f"{record['type'].upper()} {record['name'].lower()}"
+        groups.setdefault(group, []).append((group, kind, operation))
+
+    for record in deletes:
+        add(record, "deletes", {"id": record["id"]})
+    for record, changes in patches:
+        add(record, "patches", {"id": record["id"], **changes})
+    for record in posts:
+        add(record, "posts", record)
+
+    batches: list[list[tuple[str, str, dict[str, Any]]]] = []
+    current: list[tuple[str, str, dict[str, Any]]] = []
+    for operations in groups.values():
+        if current and len(current) + len(operations) > size:
+            batches.append(current)
+            current = []
+        for chunk in chunked(operations, size):
+            if len(current) + len(chunk) > size:
+                batches.append(current)
+                current = []
+            current.extend(chunk)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def cmd_cf_dns_apply(args: argparse.Namespace) -> None:
+    token = cf_token(args)
+    zone_id = cf_zone_id(args)
+    zone_name = (args.cf_zone_name or env("CLOUDFLARE_ZONE_NAME", default=DEFAULT_CF_ZONE_NAME)).lower()
+    desired = load_dns_records(Path(args.records), zone_name)
+    existing = list_dns_records(argparse.Namespace(**{**vars(args), "refresh": True}), zone_id)
+    posts, patches, deletes = diff_dns_records(existing, desired, prune=args.prune)
+
+    for record in deletes:
+        print(f"- {dns_record_label(record)}")
+    for record, changes in patches:
+        detail = ", ".join(f"{field}: {record.get(field)!r} -> {value!r}" for field, value in changes.items())
+        print(f"~ {dns_record_label(record)}  [{detail}]")
+    for record in posts:
+        print(f"+ {dns_record_label(record)}")
+    unchanged = len(desired) - len(posts) - len(patches)
+    print(f"{len(posts)} to create, {len(patches)} to update, {len(deletes)} to delete, {unchanged} unchanged.")
+    if args.dry_run or not (posts or patches or deletes):
+        return
+
+    batches = dns_batches(deletes, patches, posts, args.batch_size)
+    applied = 0
+    try:
+        for number, batch in enumerate(batches, start=1):
+            body: dict[str, list[dict[str, Any]]] = {}
+            groups: list[str] = []
+            for group, kind, operation in batch:
+                body.setdefault(kind, []).append(operation)
+                if group not in groups:
+                    groups.append(group)
+            cf_request("POST", f"/zones/{zone_id}/dns_records/batch", token=token, body=body)
+            applied = number
+            shown = ", ".join(groups[:3]) + (f" and {len(groups) - 3} more" if len(groups) > 3 else "")
+            print(f"Applied batch {number}/{len(batches)} ({len(batch)} changes: {shown})", flush=True)
+    except SystemExit:
+        total = len(batches)
+        if applied < total:
+            done = "none" if not applied else "1" if applied == 1 else f"1-{applied}"
+            left = f"{applied + 1}" if applied + 1 == total else f"{applied + 1}-{total}"
+            print(
+                f"Batch {applied + 1}/{total} failed. Applied: {done}; not applied: {left}. "
+                "Re-run to apply the rest.",
+                file=sys.stderr,
+            )
+        raise
+    finally:
+        cache_invalidate(token, "dns_records")
+
+
+def purge_targets(args: argparse.Namespace) -> tuple[list[str], list[str]]:
+    urls = list(args.url or [])
+    for url_file in args.url_file or []:
+        urls.extend(read_url_file(url_file))
+    for sitemap in args.sitemap or []:
+        urls.extend(read_sitemap(sitemap))
+    prefixes = [re.sub(r"^https?://", "", prefix) for prefix in args.prefix or []]
+    return unique(urls), unique(prefixes)
+
+
+def purge_batches(
+    token: str,
+    zone_id: str,
+    batches: list[tuple[str, list[str]]],
+    *,
+    concurrency: int,
+    rate: float,
+) -> bool:
+    limiter = RateLimiter(rate)
+    total = len(batches)
+
+    def purge(index: int, kind: str, items: list[str]) -> tuple[int, str, int, str | None]:
+        limiter.acquire()
+        try:
+            data = cf_request(
+                "POST", f"/zones/{zone_id}/purge_cache", token=token, body={kind: items}, idempotent=True
+            )
+        except SystemExit as error:
+            return index, kind, len(items), str(error)
+        if not data.get("success", True):
+            return index, kind, len(items), json.dumps(data.get("errors"), ensure_ascii=False)
+        return index, kind, len(items), None
+
+    failed = 0
+    purged = 0
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = [
+            pool.submit(purge, index, kind, items)
+            for index, (kind, items) in enumerate(batches, start=1)
+        ]
+        for future in futures:
+            index, kind, count, error = future.result()
+            if error:
+                failed += 1
+                print(f"chunk {index}/{total}: {count} {kind} FAILED {error}", flush=True)
+            else:
+                purged += count
+                print(f"chunk {index}/{total}: {count} {kind} ok", flush=True)
+
+    print(f"Purged {purged} entries in {total - failed}/{total} chunks.")
+    return failed == 0
+
+
+def cmd_cf_purge(args: argparse.Namespace) -> None:
+    urls, prefixes = purge_targets(args)
+    if not args.everything and not urls and not prefixes:
+        raise SystemExit("Pass --everything or one/more --url, --url-file, --sitemap or --prefix values.")
+
+    token = cf_token(args)
+    zone_id = cf_zone_id(args)
+    if args.everything:
+        body = {"purge_everything": True}
+        data = cf_request("POST", f"/zones/{zone_id}/purge_cache", token=token, body=body, idempotent=True)
+        print(json.dumps(data, indent=2, ensure_ascii=False))
+        return
+
+    batches = [("files", chunk) for chunk in chunked(urls, args.chunk_size)]
+    batches += [("prefixes", chunk) for chunk in chunked(prefixes, args.chunk_size)]
+    if not purge_batches(token, zone_id, batches, concurrency=args.concurrency, rate=args.rate):
+        raise SystemExit(1)
+
+
+FIREWALL_EVENTS_QUERY = """
+query ListFirewallEvents($zoneTag: string, $filter: FirewallEventsAdaptiveFilter_InputObject, $limit: uint64) {
+  viewer {
+    zones(filter: { zoneTag: $zoneTag }) {
+      firewallEventsAdaptive(filter: $filter, limit: $limit, orderBy: [datetime_ORDER]) {
+        action
+        clientCountryName
+        clientIP
+        clientRequestHTTPHost
+        clientRequestPath
+        datetime
+        rayName
+        source
+        userAgent
+      }
+    }
+  }
+}
+"""
+
+
+def cf_time(moment: datetime) -> str:
+    return moment.astimezone(timezone.utc).isoformat(timespec="seconds").replace("+00:00", "Z")
+
+
+def parse_cf_time(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def cf_graphql(token: str, query: str, variables: dict[str, Any]) -> dict[str, Any]:
+    body = {"query": query, "variables": variables}
+    data = cf_request("POST", "/graphql", token=token, body=body, idempotent=True)
+    if data.get("errors"):
+        print(json.dumps(data, indent=2, ensure_ascii=False), file=sys.stderr)
+        raise SystemExit(1)
+    return data.get("data") or {}
+
+
+def event_key(event: dict[str, Any]) -> str:
+    return event.get("rayName") or json.dumps(event, sort_keys=True)
+
+
+class RecentKeys:
+    """Bounded set that forgets the oldest keys first."""
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self._keys: dict[str, None] = {}
+
+    def add(self, key: str) -> bool:
+        if key in self._keys:
+            return False
+        self._keys[key] = None
+        if len(self._keys) > self.size:
+            del self._keys[next(iter(self._keys))]
+        return True
+
+
+def iter_firewall_events(
+    token: str,
+    zone_id: str,
+    start: datetime,
+    end: datetime,
+    *,
+    page_size: int,
+    descending: bool = True,
+    limiter: RateLimiter | None = None,
+) -> Iterator[dict[str, Any]]:
+    # Keyset pagination on datetime. Events sharing the cursor second are
+    # de-duplicated by rayName, so memory stays bounded by one second of events.
+    query = FIREWALL_EVENTS_QUERY.replace("ORDER", "DESC" if descending else "ASC")
+    bound = "datetime_leq" if descending else "datetime_geq"
+    cursor = cf_time(end if descending else start)
+    window = {"datetime_geq": cf_time(start), "datetime_leq": cf_time(end)}
+    boundary: set[str] = set()
+    strict = False
+    while True:
+        page_filter = dict(window)
+        if strict:
+            page_filter.pop(bound)
+            page_filter["datetime_lt" if descending else "datetime_gt"] = cursor
+        else:
+            page_filter[bound] = cursor
+        if limiter:
+            limiter.acquire()
+        data = cf_graphql(token, query, {"zoneTag": zone_id, "limit": page_size, "filter": page_filter})
+        zones = (data.get("viewer") or {}).get("zones") or []
+        page = zones[0].get("firewallEventsAdaptive", []) if zones else []
+        fresh = [
+            event
+            for event in page
+            if not (event.get("datetime") == cursor and event_key(event) in boundary)
+        ]
+        yield from fresh
+        if len(page) < page_size:
+            return
+
+        last = page[-1]["datetime"]
+        if not fresh:
+            # A whole page shares one second we have already emitted; step past it.
+            print(
+                f"warning: more than {page_size} events at {cursor}; some were skipped. "
+                "Raise --page-size to read them all.",
+                file=sys.stderr,
+            )
+            strict = True
+            boundary = set()
+            continue
+        strict = False
+        same_second = {event_key(event) for event in page if event.get("datetime") == last}
+        boundary = boundary | same_second if last == cursor else same_second
+        cursor = last
+
+
+@dataclass
+class ShardEnd:
+    error: BaseException | None = None
+
+
+def iter_sharded_firewall_events(
+    token: str,
+    zone_id: str,
+    start: datetime,
+    end: datetime,
+    *,
+    shards: int,
+    page_size: int,
+    rate: float,
+    descending: bool = True,
+) -> Iterator[dict[str, Any]]:
+    # Each time shard is paged by its own thread into a bounded queue; the
+    # queues are heap-merged by datetime and duplicates at shard edges dropped.
+    limiter = RateLimiter(rate)
+    span = (end - start) / shards
+    bounds = [start + span * index for index in range(shards)] + [end]
+    windows = list(zip(bounds, bounds[1:]))
+    stop = threading.Event()
+    queues: list[queue.Queue[Any]] = [queue.Queue(maxsize=page_size * 2) for _ in windows]
+
+    def put(target: queue.Queue[Any], item: Any) -> bool:
+        while not stop.is_set():
+            try:
+                target.put(item, timeout=0.2)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce(target: queue.Queue[Any], shard_start: datetime, shard_end: datetime) -> None:
+        try:
+            for event in iter_firewall_events(
+                token,
+                zone_id,
+                shard_start,
+                shard_end,
+                page_size=page_size,
+                descending=descending,
+                limiter=limiter,
+            ):
+                if not put(target, event):
+                    return
+        except BaseException as error:
+            put(target, ShardEnd(error))
+            return
+        put(target, ShardEnd())
+
+    def consume(source: queue.Queue[Any]) -> Iterator[dict[str, Any]]:
+        while True:
+            item = source.get()
+            if isinstance(item, ShardEnd):
+                if item.error:
+                    raise item.error
+                return
+            yield item
+
+    for target, (shard_start, shard_end) in zip(queues, windows):
+        threading.Thread(target=produce, args=(target, shard_start, shard_end), daemon=True).start()
+
+    current: str | None = None
+    keys: set[str] = set()
+    try:
+        merged = heapq.merge(
+            *(consume(source) for source in queues),
+            key=lambda event: event.get("datetime") or "",
+            reverse=descending,
+        )
+        for event in merged:
+            if event.get("datetime") != current:
+                current = event.get("datetime")
+                keys = set()
+            key = event_key(event)
+            if key in keys:
+                continue
+            keys.add(key)
+            yield event
+    finally:
+        stop.set()
+
+
+def format_firewall_event(event: dict[str, Any]) -> str:
+    return (
+        f"{event.get('datetime')} {event.get('action'):10} "
+        f"{event.get('clientIP')} {event.get('clientCountryName')} "
+        f"{event.get('clientRequestHTTPHost')}{event.get('clientRequestPath')} "
+        f"[{event.get('source')}]"
+    )
+
+
+def emit_firewall_event(event: dict[str, Any], output_format: str) -> None:
+    if output_format == "ndjson":
+        print(json.dumps(event, ensure_ascii=False, separators=(",", ":")), flush=True)
+    else:
+        print(format_firewall_event(event), flush=True)
+
+
+def follow_firewall_events(
+    args: argparse.Namespace, token: str, zone_id: str, since: datetime, seen: RecentKeys
+) -> None:
+    # Cloudflare can index events a little late, so each poll re-reads a short
+    # overlap and drops anything already emitted.
+    lag = timedelta(seconds=args.follow_lag)
+    while True:
+        time.sleep(args.interval)
+        now = datetime.now(timezone.utc)
+        newest = since
+        for event in iter_firewall_events(
+            token, zone_id, since - lag, now, page_size=args.page_size, descending=False
+        ):
+            if seen.add(event_key(event)):
+                emit_firewall_event(event, args.format)
+                newest = max(newest, parse_cf_time(event["datetime"]))
+        since = newest
+
+
+class SpaceSaving:
+    """Space-Saving top-k sketch: at most `capacity` counters, counts are upper bounds."""
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self.counts: dict[str, int] = {}
+        self.errors: dict[str, int] = {}
+        self._heap: list[tuple[int, str]] = []
+
+    def add(self, item: str, weight: int = 1) -> None:
+        if item in self.counts:
+            self.counts[item] += weight
+        elif len(self.counts) < self.capacity:
+            self.counts[item] = weight
+            self.errors[item] = 0
+        else:
+            # Evict the current minimum; heap entries are lazy and may be stale.
+            while True:
+                count, victim = heapq.heappop(self._heap)
+                if self.counts.get(victim) == count:
+                    break
+            del self.counts[victim]
+            del self.errors[victim]
+            self.counts[item] = count + weight
+            self.errors[item] = count
+        heapq.heappush(self._heap, (self.counts[item], item))
+        if len(self._heap) > 4 * self.capacity:
+            self._heap = [(count, key) for key, count in self.counts.items()]
+            heapq.heapify(self._heap)
+
+    def top(self, k: int) -> list[tuple[str, int, int]]:
+        ranked = heapq.nlargest(k, self.counts.items(), key=lambda pair: pair[1])
+        return [(item, count, self.errors[item]) for item, count in ranked]
+
+
+AGGREGATE_FIELDS = {
+    "client IPs": "clientIP",
+    "paths": "clientRequestPath",
+    "countries": "clientCountryName",
+    "user agents": "userAgent",
+    "actions": "action",
+}
+
+
+def aggregate_firewall_events(events: Iterator[dict[str, Any]], *, top: int, capacity: int) -> None:
+    sketches = {label: SpaceSaving(capacity) for label in AGGREGATE_FIELDS}
+    per_minute: dict[str, int] = {}
+    total = 0
+    for event in events:
+        total += 1
+        for label, field_name in AGGREGATE_FIELDS.items():
+            sketches[label].add(str(event.get(field_name) or "-"))
+        minute = (event.get("datetime") or "")[:16]
+        per_minute[minute] = per_minute.get(minute, 0) + 1
+
+    if not total:
+        print("No Cloudflare security events to aggregate.")
+        return
+    print(f"{total} events over {len(per_minute)} minutes ({total / len(per_minute):.1f}/min average)")
+    for label, sketch in sketches.items():
+        print(f"\nTop {label}:")
+        for item, count, error in sketch.top(top):
+            bound = f" (±{error})" if error else ""
+            print(f"  {count:>9}{bound}  {count / total:6.1%}  {item}")
+    print("\nPeak minutes:")
+    for minute, count in heapq.nlargest(min(top, 5), per_minute.items(), key=lambda pair: pair[1]):
+        print(f"  {minute}Z  {count}/min")
+
+
+def read_lines(source: str) -> Iterator[str]:
+    handle = sys.stdin if source == "-" else open(source, encoding="utf-8")
+    try:
+        for line in handle:
+            if line.strip():
+                yield line.strip()
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+
+def read_ndjson(source: str) -> Iterator[dict[str, Any]]:
+    return (json.loads(line) for line in read_lines(source))
+
+
+def security_event_stream(
+    args: argparse.Namespace,
+    token: str,
+    zone_id: str,
+    start: datetime,
+    end: datetime,
+    *,
+    page_size: int,
+    descending: bool,
+) -> Iterator[dict[str, Any]]:
+    if args.shards > 1:
+        return iter_sharded_firewall_events(
+            token,
+            zone_id,
+            start,
+            end,
+            shards=args.shards,
+            page_size=page_size,
+            rate=args.rate,
+            descending=descending,
+        )
+    return iter_firewall_events(token, zone_id, start, end, page_size=page_size, descending=descending)
+
+
+def cmd_cf_security_events(args: argparse.Namespace) -> None:
+    if args.input:
+        if not args.aggregate:
+            raise SystemExit("--input is only supported with --aggregate.")
+        aggregate_firewall_events(read_ndjson(args.input), top=args.top, capacity=args.counters)
+        return
+
+    token = cf_token(args)
+    zone_id = cf_zone_id(args)
+    now = datetime.now(timezone.utc)
+    start = now - timedelta(minutes=args.minutes)
+
+    if args.aggregate:
+        events = security_event_stream(
+            args, token, zone_id, start, now, page_size=args.page_size, descending=False
+        )
+        aggregate_firewall_events(events, top=args.top, capacity=args.counters)
+        return
+
+    page_size = min(args.page_size, args.limit) if args.limit and args.shards == 1 else args.page_size
+    # Follow mode prints oldest-first: an unlimited backlog is streamed ascending,
+    # a limited one is read newest-first and held (bounded by --limit) to reverse.
+    descending = not (args.follow and not args.limit)
+    seen = RecentKeys(50_000)
+    newest = start
+    events = security_event_stream(
+        args, token, zone_id, start, now, page_size=page_size, descending=descending
+    )
+    backlog: list[dict[str, Any]] = []
+    count = 0
+    for event in events:
+        if args.limit and count >= args.limit:
+            break
+        count += 1
+        seen.add(event_key(event))
+        newest = max(newest, parse_cf_time(event["datetime"]))
+        if args.follow and descending:
+            backlog.append(event)
+        else:
+            emit_firewall_event(event, args.format)
+
+    for event in reversed(backlog):
+        emit_firewall_event(event, args.format)
+    if not count and args.format == "text":
+        print(f"No Cloudflare security events in the last {args.minutes} minutes.", flush=True)
+    if args.follow:
+        try:
+            follow_firewall_events(args, token, zone_id, newest, seen)
+        except KeyboardInterrupt:
+            pass
+
+
+CACHE_STATS_QUERY = """
+query CacheStats($zoneTag: string, $filter: ZoneHttpRequestsAdaptiveGroupsFilter_InputObject, $limit: uint64) {
+  viewer {
+    zones(filter: { zoneTag: $zoneTag }) {
+      httpRequestsAdaptiveGroups(filter: $filter, limit: $limit, orderBy: [count_DESC]) {
+        count
+        sum {
+          edgeResponseBytes
+        }
+        dimensions {
+          cacheStatus
+          clientRequestPath
+          edgeResponseContentTypeName
+        }
+      }
+    }
+  }
+}
+"""
+CACHE_HIT_STATUSES = {"hit", "stale", "updating", "revalidated"}
+# Statuses where Cloudflare fetched the response body from the origin.
+ORIGIN_FETCH_STATUSES = {"miss", "expired", "bypass", "dynamic", "none", "unknown"}
+CACHE_STATS_SLICE = timedelta(hours=24)
+
+
+@dataclass
+class CacheBucket:
+    requests: int = 0
+    hits: int = 0
+    bytes: int = 0
+    origin_requests: int = 0
+    origin_bytes: int = 0
+
+    def add(self, status: str, count: int, size: int) -> None:
+        self.requests += count
+        self.bytes += size
+        if status in CACHE_HIT_STATUSES:
+            self.hits += count
+        elif status in ORIGIN_FETCH_STATUSES:
+            self.origin_requests += count
+            self.origin_bytes += size
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "hit_ratio": round(self.hits / self.requests, 4) if self.requests else None,
+            "bytes": self.bytes,
+            "origin_requests": self.origin_requests,
+            "origin_bytes": self.origin_bytes,
+        }
+
+
+def format_bytes(size: float) -> str:
+    for unit in ["B", "KB", "MB", "GB"]:
+        if abs(size) < 1024:
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024
+    return f"{size:.1f}TB"
+
+
+def path_prefix(path: str, depth: int) -> str:
+    parts = [part for part in path.split("?", 1)[0].split("/") if part]
+    if not parts:
+        return "/"
+    return "/" + "/".join(parts[:depth]) + ("/" if len(parts) > depth else "")
+
+
+def iter_cache_groups(
+    token: str, zone_id: str, start: datetime, end: datetime, *, limit: int, host: str | None
+) -> Iterator[dict[str, Any]]:
+    # Adaptive group queries are capped at a one-day range, so longer windows
+    # are read a day at a time and summed.
+    slice_start = start
+    while slice_start < end:
+        slice_end = min(slice_start + CACHE_STATS_SLICE, end)
+        request_filter: dict[str, Any] = {
+            "datetime_geq": cf_time(slice_start),
+            "datetime_lt": cf_time(slice_end),
+            "requestSource": "eyeball",
+        }
+        if host:
+            request_filter["clientRequestHTTPHost"] = host
+        data = cf_graphql(
+            token, CACHE_STATS_QUERY, {"zoneTag": zone_id, "filter": request_filter, "limit": limit}
+        )
+        zones = (data.get("viewer") or {}).get("zones") or [{}]
+        groups = zones[0].get("httpRequestsAdaptiveGroups") or []
+        if len(groups) >= limit:
+            print(
+                f"Warning: {cf_time(slice_start)}..{cf_time(slice_end)} returned the maximum {limit} groups; "
+                "the rarest paths are missing. Narrow --minutes or raise --group-limit.",
+                file=sys.stderr,
+            )
+        yield from groups
+        slice_start = slice_end
+
+
+def summarize_cache_groups(groups: Iterator[dict[str, Any]], *, depth: int) -> dict[str, Any]:
+    total = CacheBucket()
+    by_status: dict[str, CacheBucket] = collections.defaultdict(CacheBucket)
+    by_type: dict[str, CacheBucket] = collections.defaultdict(CacheBucket)
+    by_prefix: dict[str, CacheBucket] = collections.defaultdict(CacheBucket)
+    by_path: dict[str, CacheBucket] = collections.defaultdict(CacheBucket)
+    for group in groups:
+        dimensions = group.get("dimensions") or {}
+        status = (dimensions.get("cacheStatus") or "unknown").lower()
+        path = dimensions.get("clientRequestPath") or "/"
+        count = int(group.get("count") or 0)
+        size = int((group.get("sum") or {}).get("edgeResponseBytes") or 0)
+        for bucket in (
+            total,
+            by_status[status],
+            by_type[dimensions.get("edgeResponseContentTypeName") or "-"],
+            by_prefix[path_prefix(path, depth)],
+            by_path[path],
+        ):
+            bucket.add(status, count, size)
+    return {
+        "total": total,
+        "status": by_status,
+        "content_type": by_type,
+        "prefix": by_prefix,
+        "path": by_path,
+    }
+
+
+def print_cache_table(
+    title: str, buckets: dict[str, CacheBucket], top: int, *, key: Callable[[CacheBucket], int]
+) -> None:
+    rows = heapq.nlargest(top, buckets.items(), key=lambda pair: key(pair[1]))
+    if not rows:
+        return
+    width = max(12, *(len(name) for name, _ in rows))
+    print(f"\n{title}")
+    print(f"  {'':<{width}} {'requests':>10} {'hit%':>6} {'origin req':>11} {'origin bytes':>13}")
+    for name, bucket in rows:
+        ratio = f"{bucket.hits / bucket.requests:.0%}" if bucket.requests else "-"
+        print(
+            f"  {name:<{width}} {bucket.requests:>10} {ratio:>6} "
+            f"{bucket.origin_requests:>11} {format_bytes(bucket.origin_bytes):>13}"
+        )
+
+
+def cmd_cf_cache_stats(args: argparse.Namespace) -> None:
+    token = cf_token(args)
+    zone_id = cf_zone_id(args)
+    end = datetime.now(timezone.utc)
+    start = end - timedelta(minutes=args.minutes)
+    groups = iter_cache_groups(token, zone_id, start, end, limit=args.group_limit, host=args.host)
+    stats = summarize_cache_groups(groups, depth=args.depth)
+    total: CacheBucket = stats["total"]
+
+    if args.format == "json":
+        top_uncached = heapq.nlargest(args.top, stats["path"].items(), key=lambda pair: pair[1].origin_requests)
+        report = {
+            "window": {"start": cf_time(start), "end": cf_time(end)},
+            "total": total.as_dict(),
+            "byte_hit_ratio": round(1 - total.origin_bytes / total.bytes, 4) if total.bytes else None,
+            **{
+                name: {key: bucket.as_dict() for key, bucket in stats[name].items()}
+                for name in ("status", "content_type", "prefix")
+            },
+            "top_uncached_paths": [
+                {"path": path, **bucket.as_dict()} for path, bucket in top_uncached if bucket.origin_requests
+            ],
+        }
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+
+    if not total.requests:
+        print(f"No HTTP requests recorded in the last {args.minutes} minutes.")
+        return
+    print(f"{total.requests} requests in the last {args.minutes} minutes ({cf_time(start)} .. {cf_time(end)})")
+    print(f"Request hit ratio: {total.hits / total.requests:.1%}")
+    if total.bytes:
+        print(
+            f"Bytes served: {format_bytes(total.bytes)}; from origin: {format_bytes(total.origin_bytes)} "
+            f"(byte hit ratio {1 - total.origin_bytes / total.bytes:.1%})"
+        )
+
+    print("\nBy cache status")
+    for status, bucket in sorted(stats["status"].items(), key=lambda pair: -pair[1].requests):
+        print(
+            f"  {status:<12} {bucket.requests:>10} {bucket.requests / total.requests:7.1%} "
+            f"{format_bytes(bucket.bytes):>10}"
+        )
+    print_cache_table("By content type", stats["content_type"], args.top, key=lambda bucket: bucket.requests)
+    print_cache_table(
+        f"By path prefix (depth {args.depth})",
+        stats["prefix"],
+        args.top,
+        key=lambda bucket: bucket.origin_requests,
+    )
+    uncached = {path: bucket for path, bucket in stats["path"].items() if bucket.origin_requests}
+    print_cache_table("Top uncached paths", uncached, args.top, key=lambda bucket: bucket.origin_requests)
+
+
+EVENT_COLUMNS = [
+    "rayName",
+    "zoneTag",
+    "datetime",
+    "action",
+    "clientIP",
+    "clientCountryName",
+    "clientRequestHTTPHost",
+    "clientRequestPath",
+    "source",
+    "userAgent",
+]
+EVENT_FIELD_ALIASES = {
+    "ip": "clientIP",
+    "country": "clientCountryName",
+    "host": "clientRequestHTTPHost",
+    "path": "clientRequestPath",
+    "ua": "userAgent",
+}
+
+
+def open_events_db(path: Path = EVENTS_DB) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(path)
+    db.row_factory = sqlite3.Row
+    db.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS firewall_events (
+            rayName TEXT PRIMARY KEY,
+            zoneTag TEXT NOT NULL,
+            datetime TEXT NOT NULL,
+            action TEXT,
+            clientIP TEXT,
+            clientCountryName TEXT,
+            clientRequestHTTPHost TEXT,
+            clientRequestPath TEXT,
+            source TEXT,
+            userAgent TEXT
+        );
+        CREATE INDEX IF NOT EXISTS firewall_events_datetime ON firewall_events (zoneTag, datetime);
+        CREATE INDEX IF NOT EXISTS firewall_events_client_ip ON firewall_events (clientIP, datetime);
+        CREATE INDEX IF NOT EXISTS firewall_events_path ON firewall_events (clientRequestPath, datetime);
+        CREATE INDEX IF NOT EXISTS firewall_events_action ON firewall_events (action, datetime);
+        CREATE TABLE IF NOT EXISTS firewall_sync (
+            zoneTag TEXT PRIMARY KEY,
+            syncedUntil TEXT NOT NULL
+        );
+        """
+    )
+    return db
+
+
+def cmd_events_sync(args: argparse.Namespace) -> None:
+    token = cf_token(args)
+    zone_id = cf_zone_id(args)
+    now = datetime.now(timezone.utc)
+    db = open_events_db()
+    row = db.execute("SELECT syncedUntil FROM firewall_sync WHERE zoneTag = ?", (zone_id,)).fetchone()
+    earliest = now - timedelta(minutes=args.minutes)
+    if row:
+        # Re-read a short overlap for late-indexed events; the primary key drops repeats.
+        start = max(earliest, parse_cf_time(row["syncedUntil"]) - timedelta(seconds=args.overlap))
+    else:
+        start = earliest
+
+    if args.shards > 1:
+        events = iter_sharded_firewall_events(
+            token,
+            zone_id,
+            start,
+            now,
+            shards=args.shards,
+            page_size=args.page_size,
+            rate=args.rate,
+            descending=False,
+        )
+    else:
+        events = iter_firewall_events(token, zone_id, start, now, page_size=args.page_size, descending=False)
+
+    insert = (
+        f"INSERT OR IGNORE INTO firewall_events ({', '.join(EVENT_COLUMNS)}) "
+        f"VALUES ({', '.join('?' for _ in EVENT_COLUMNS)})"
+    )
+    seen = inserted = 0
+    batch: list[tuple[Any, ...]] = []
+    for event in events:
+        seen += 1
+        event = {**event, "rayName": event_key(event), "zoneTag": zone_id}
+        batch.append(tuple(event.get(column) for column in EVENT_COLUMNS))
+        if len(batch) >= 1000:
+            inserted += db.executemany(insert, batch).rowcount
+            db.commit()
+            batch = []
+    if batch:
+        inserted += db.executemany(insert, batch).rowcount
+    db.execute(
+        "INSERT INTO firewall_sync (zoneTag, syncedUntil) VALUES (?, ?) "
+        "ON CONFLICT (zoneTag) DO UPDATE SET syncedUntil = excluded.syncedUntil",
+        (zone_id, cf_time(now)),
+    )
+    db.commit()
+    total = db.execute("SELECT COUNT(*) FROM firewall_events WHERE zoneTag = ?", (zone_id,)).fetchone()[0]
+    db.close()
+    print(f"Synced {cf_time(start)} .. {cf_time(now)}: {seen} events read, {inserted} new, {total} stored.")
+
+
+def event_field(name: str) -> str:
+    field_name = EVENT_FIELD_ALIASES.get(name, name)
+    if field_name == "minute":
+        return "substr(datetime, 1, 16)"
+    if field_name not in EVENT_COLUMNS:
+        choices = ", ".join(sorted([*EVENT_COLUMNS, *EVENT_FIELD_ALIASES, "minute"]))
+        raise SystemExit(f"Unknown event field {name!r}. Choose from: {choices}")
+    return field_name
+
+
+def cmd_events_query(args: argparse.Namespace) -> None:
+    if not EVENTS_DB.exists():
+        raise SystemExit("No local event store yet. Run events-sync first.")
+
+    clauses: list[str] = []
+    params: list[Any] = []
+    zone_id = args.cf_zone_id or env("CLOUDFLARE_ZONE_ID", "CF_ZONE_ID")
+    if zone_id:
+        clauses.append("zoneTag = ?")
+        params.append(zone_id)
+    if args.minutes:
+        clauses.append("datetime >= ?")
+        params.append(cf_time(datetime.now(timezone.utc) - timedelta(minutes=args.minutes)))
+    for column, value in (
+        ("clientIP", args.ip),
+        ("action", args.action),
+        ("clientCountryName", args.country),
+        ("clientRequestHTTPHost", args.host),
+        ("source", args.source),
+    ):
+        if value:
+            clauses.append(f"{column} = ?")
+            params.append(value)
+    if args.path:
+        clauses.append("clientRequestPath LIKE ?")
+        params.append(args.path)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+    db = open_events_db()
+    started = time.perf_counter()
+    if args.group_by:
+        columns = [event_field(name) for name in args.group_by]
+        rows = db.execute(
+            f"SELECT {', '.join(columns)}, COUNT(*) AS events FROM firewall_events {where} "
+            f"GROUP BY {', '.join(columns)} ORDER BY events DESC LIMIT ?",
+            [*params, args.limit],
+        ).fetchall()
+    else:
+        rows = db.execute(
+            f"SELECT {', '.join(EVENT_COLUMNS)} FROM firewall_events {where} ORDER BY datetime DESC LIMIT ?",
+            [*params, args.limit],
+        ).fetchall()
+    elapsed = time.perf_counter() - started
+    db.close()
+
+    for row in rows:
+        if args.group_by:
+            if args.format == "ndjson":
+                print(json.dumps(dict(zip(args.group_by + ["events"], tuple(row))), ensure_ascii=False))
+            else:
+                print(f"{row['events']:>8}  " + "  ".join(str(value) for value in tuple(row)[:-1]))
+        else:
+            emit_firewall_event(dict(row), args.format)
+    print(f"{len(rows)} rows in {elapsed * 1000:.1f}ms", file=sys.stderr)
+
+
+def warm_targets(args: argparse.Namespace) -> list[str]:
+    urls = list(args.url or [])
+    for url_file in args.url_file or []:
+        urls.extend(read_url_file(url_file))
+    if args.manifest:
+        manifest = load_manifest(Path(args.manifest))
+        if manifest is None:
+            raise SystemExit(f"Manifest not found: {args.manifest}. Run vercel-deploy first.")
+        origin = (args.site_origin or DEFAULT_SITE_ORIGINS)[0].rstrip("/")
+        urls.extend(origin + file_routes(name)[0] for name in manifest.get("files") or {})
+    for sitemap in args.sitemap or []:
+        urls.extend(read_sitemap(sitemap))
+    if not urls:
+        urls = read_sitemap(str(DEFAULT_SITEMAP))
+    return unique([rebase_url(url, args.origin) for url in urls])
+
+
+def cmd_cache_warm(args: argparse.Namespace) -> None:
+    urls = warm_targets(args)
+    print(f"Warming {len(urls)} URLs with {args.concurrency} workers...", flush=True)
+
+    def report(result: FetchResult) -> None:
+        if args.quiet:
+            return
+        cache = result.headers.get("cf-cache-status", "-")
+        status = result.status or "ERR"
+        print(f"{status:>4} {cache:9} {result.ttfb * 1000:7.0f}ms {result.url}", flush=True)
+
+    started = time.perf_counter()
+    results = fetch_urls(
+        urls,
+        concurrency=args.concurrency,
+        headers={"User-Agent": "medora-ops-cache-warm/1.0", "Accept-Encoding": "gzip, deflate, br"},
+        on_result=report,
+    )
+    wall = time.perf_counter() - started
+
+    failed = [result for result in results if result.error or result.status >= 400]
+    ttfbs = [result.ttfb * 1000 for result in results if not result.error]
+    statuses: dict[str, int] = {}
+    for result in results:
+        if not result.error:
+            cache = result.headers.get("cf-cache-status", "none")
+            statuses[cache] = statuses.get(cache, 0) + 1
+    print(f"\nWarmed {len(results) - len(failed)}/{len(results)} URLs in {wall:.1f}s")
+    print("cf-cache-status: " + (", ".join(f"{key}={value}" for key, value in sorted(statuses.items())) or "-"))
+    print(
+        f"TTFB p50={percentile(ttfbs, 50):.0f}ms p90={percentile(ttfbs, 90):.0f}ms "
+        f"p99={percentile(ttfbs, 99):.0f}ms max={max(ttfbs, default=0):.0f}ms"
+    )
+    slowest = sorted((result for result in results if not result.error), key=lambda r: r.ttfb, reverse=True)
+    for result in slowest[:5]:
+        print(f"  slow {result.ttfb * 1000:7.0f}ms {result.url}")
+    for result in failed:
+        print(f"  failed {result.status or result.error} {result.url}")
+    if failed:
+        raise SystemExit(1)
+
+
+VERCEL_CONFIG_FILE = ROOT / "vercel.json"
+# Vite emits build output as assets/<name>-<8 char hash>.<ext>.
+HASHED_ASSET_RE = re.compile(r"^/assets/.+-[A-Za-z0-9_-]{8}\.[a-z0-9]+$")
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+AUDIT_ENCODINGS = "gzip, deflate, br" if brotli else "gzip, deflate"
+
+
+@dataclass
+class HeaderRule:
+    source: str
+    pattern: re.Pattern[str]
+    headers: dict[str, str]
+
+
+def vercel_source_pattern(source: str) -> re.Pattern[str]:
+    # vercel.json sources are path-to-regexp patterns: ":name*" matches the
+    # rest of the path, ":name" one segment and "(...)" is a raw regex group.
+    pattern = re.sub(r":\w+\*", ".*", source)
+    pattern = re.sub(r":\w+", "[^/]+", pattern)
+    return re.compile(f"^{pattern}$")
+
+
+def load_header_rules(path: Path = VERCEL_CONFIG_FILE) -> list[HeaderRule]:
+    try:
+        config = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as error:
+        raise SystemExit(f"Could not read {path}: {error}") from error
+    return [
+        HeaderRule(
+            rule["source"],
+            vercel_source_pattern(rule["source"]),
+            {header["key"].lower(): header["value"] for header in rule.get("headers") or []},
+        )
+        for rule in config.get("headers") or []
+    ]
+
+
+def expected_headers(path: str, rules: list[HeaderRule]) -> dict[str, tuple[str, str]]:
+    expected: dict[str, tuple[str, str]] = {}
+    for rule in rules:
+        if rule.pattern.match(path):
+            for key, value in rule.headers.items():
+                expected[key] = (value, rule.source)
+    return expected
+
+
+def header_tokens(value: str) -> set[str]:
+    return {part.strip().lower() for part in value.split(",") if part.strip()}
+
+
+def decode_body(body: bytes, encoding: str) -> bytes | None:
+    encoding = encoding.strip().lower()
+    if encoding in {"", "identity"}:
+        return body
+    if encoding in {"gzip", "deflate"}:
+        try:
+            return zlib.decompress(body, zlib.MAX_WBITS | 32)
+        except zlib.error:
+            return None
+    if encoding == "br" and brotli:
+        return brotli.decompress(body)
+    return None
+
+
+class AssetLinkParser(HTMLParser):
+    """Collects script, stylesheet, preload, icon and image URLs from a page."""
+
+    LINK_RELS = {"stylesheet", "modulepreload", "preload", "icon", "apple-touch-icon", "manifest"}
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.links: list[str] = []
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, str | None]]) -> None:
+        values = dict(attrs)
+        if tag == "script" and values.get("src"):
+            self.links.append(values["src"])
+        elif tag == "link" and values.get("href"):
+            if header_tokens((values.get("rel") or "").replace(" ", ",")) & self.LINK_RELS:
+                self.links.append(values["href"])
+        elif tag in {"img", "source"} and values.get("src"):
+            self.links.append(values["src"])
+
+
+def page_asset_urls(result: FetchResult) -> list[str]:
+    if "text/html" not in result.headers.get("content-type", "") or not result.body:
+        return []
+    body = decode_body(result.body, result.headers.get("content-encoding", ""))
+    if body is None:
+        return []
+    parser = AssetLinkParser()
+    parser.feed(body.decode("utf-8", errors="replace"))
+    page = urllib.parse.urlsplit(result.url)
+    urls = []
+    for link in parser.links:
+        url = urllib.parse.urljoin(result.url, link)
+        if urllib.parse.urlsplit(url).netloc == page.netloc:
+            urls.append(urllib.parse.urldefrag(url)[0])
+    return urls
+
+
+def audit_response(result: FetchResult, rules: list[HeaderRule]) -> list[tuple[str, str]]:
+    if result.error:
+        return [("fetch-error", result.error)]
+    findings: list[tuple[str, str]] = []
+    headers = result.headers
+    path = urllib.parse.urlsplit(result.url).path or "/"
+    content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+    cache_status = headers.get("cf-cache-status", "").upper()
+    cache_control = header_tokens(headers.get("cache-control", ""))
+    if result.status >= 400:
+        findings.append(("http-error", f"status {result.status}"))
+
+    for key, (value, source) in expected_headers(path, rules).items():
+        actual = headers.get(key)
+        if actual is None:
+            findings.append(("rule-missing", f"{key} from vercel.json {source} is not sent"))
+        elif header_tokens(actual) != header_tokens(value):
+            findings.append(("rule-mismatch", f"{key}: {actual!r}, vercel.json {source} sets {value!r}"))
+
+    hashed = bool(HASHED_ASSET_RE.match(path))
+    if hashed:
+        if content_type == "text/html":
+            findings.append(
+                ("asset-fallback", "hashed asset answered with HTML by the SPA rewrite; missing or stale file")
+            )
+        elif "immutable" not in cache_control:
+            findings.append(("asset-not-immutable", f"cache-control: {headers.get('cache-control', '-')}"))
+        max_age = next((token.split("=", 1)[1] for token in cache_control if token.startswith("max-age=")), "0")
+        if content_type != "text/html" and max_age.isdigit() and int(max_age) < 30 * 24 * 3600:
+            findings.append(("asset-short-max-age", f"max-age={max_age}"))
+    bypassed = cache_status in {"BYPASS", "DYNAMIC", ""}
+    if not hashed and content_type in {"text/html", "application/json"} and bypassed:
+        reason = "no cf-cache-status header" if not cache_status else f"cf-cache-status {cache_status}"
+        if cache_control & {"no-store", "private"}:
+            reason += f" (cache-control: {headers.get('cache-control')})"
+        findings.append((f"{content_type.split('/')[1]}-bypass", reason))
+    if content_type.startswith(COMPRESSIBLE_TYPES) and not headers.get("content-encoding"):
+        size = int(headers.get("content-length") or 0)
+        if size >= 1024:
+            findings.append(("uncompressed", f"{content_type}, {format_bytes(size)}"))
+    return findings
+
+
+def audit_record(result: FetchResult, kind: str, findings: list[tuple[str, str]]) -> dict[str, Any]:
+    return {
+        "url": result.url,
+        "kind": kind,
+        "status": result.status,
+        "content_type": result.headers.get("content-type"),
+        "cf_cache_status": result.headers.get("cf-cache-status"),
+        "cache_control": result.headers.get("cache-control"),
+        "age": result.headers.get("age"),
+        "content_encoding": result.headers.get("content-encoding"),
+        "findings": [{"check": check, "detail": detail} for check, detail in findings],
+    }
+
+
+def cmd_cache_audit(args: argparse.Namespace) -> None:
+    rules = load_header_rules()
+    pages = warm_targets(args)
+    headers = {"User-Agent": "medora-ops-cache-audit/1.0", "Accept-Encoding": AUDIT_ENCODINGS}
+    print(f"Auditing {len(pages)} pages with {args.concurrency} workers...", file=sys.stderr, flush=True)
+    page_results = fetch_urls(pages, concurrency=args.concurrency, headers=headers, keep_body=not args.no_assets)
+
+    assets: list[str] = []
+    for result in page_results:
+        assets.extend(page_asset_urls(result))
+        result.body = b""
+    seen = set(pages)
+    assets = [url for url in unique(assets) if url not in seen]
+    asset_results = []
+    if assets:
+        print(f"Auditing {len(assets)} linked assets...", file=sys.stderr, flush=True)
+        asset_results = fetch_urls(assets, concurrency=args.concurrency, headers=headers)
+
+    records = [
+        audit_record(result, kind, audit_response(result, rules))
+        for kind, results in (("page", page_results), ("asset", asset_results))
+        for result in results
+    ]
+    flagged = [record for record in records if record["findings"]]
+
+    if args.format == "json":
+        print(json.dumps(records, indent=2, ensure_ascii=False))
+    else:
+        if args.verbose:
+            for record in records:
+                print(
+                    f"{record['status'] or 'ERR':>4} {record['cf_cache_status'] or '-':9} "
+                    f"age={record['age'] or '-':>6} {record['content_encoding'] or '-':5} "
+                    f"{record['cache_control'] or '-':40} {record['url']}"
+                )
+            print()
+        by_check: dict[str, list[tuple[str, str]]] = collections.defaultdict(list)
+        for record in flagged:
+            for finding in record["findings"]:
+                by_check[finding["check"]].append((record["url"], finding["detail"]))
+        for check, items in sorted(by_check.items(), key=lambda pair: -len(pair[1])):
+            print(f"{check} ({len(items)})")
+            for url, detail in items[: args.top]:
+                print(f"  {url}  {detail}")
+            if len(items) > args.top:
+                print(f"  ... {len(items) - args.top} more")
+        statuses = collections.Counter(record["cf_cache_status"] or "none" for record in records)
+        print(
+            f"\n{len(records)} URLs audited ({len(page_results)} pages, {len(asset_results)} assets); "
+            f"{len(flagged)} with findings."
+        )
+        print("cf-cache-status: " + ", ".join(f"{key}={value}" for key, value in sorted(statuses.items())))
+    if flagged:
+        raise SystemExit(1)
+
+
+def latency_summary(values: list[float]) -> dict[str, float]:
+    return {
+        "p50": round(percentile(values, 50), 1),
+        "p90": round(percentile(values, 90), 1),
+        "p99": round(percentile(values, 99), 1),
+    }
+
+
+def load_bench_history() -> list[dict[str, Any]]:
+    if not BENCH_HISTORY_FILE.exists():
+        return []
+    return json.loads(BENCH_HISTORY_FILE.read_text(encoding="utf-8")).get("runs", [])
+
+
+def save_bench_history(runs: list[dict[str, Any]]) -> None:
+    STATE_DIR.mkdir(exist_ok=True)
+    BENCH_HISTORY_FILE.write_text(json.dumps({"runs": runs[-50:]}, indent=2) + "\n", encoding="utf-8")
+
+
+def cmd_bench(args: argparse.Namespace) -> None:
+    base_url = args.base_url.rstrip("/")
+    routes = args.route or DEFAULT_BENCH_ROUTES
+    deployment = args.deployment or (
+        LAST_DEPLOYMENT_FILE.read_text(encoding="utf-8").strip() if LAST_DEPLOYMENT_FILE.exists() else base_url
+    )
+    plan = [route for route in routes for _ in range(args.requests)]
+    print(f"Benchmarking {len(routes)} routes x {args.requests} requests on {base_url} ({deployment})")
+    results = fetch_urls(
+        [base_url + route for route in plan],
+        concurrency=args.concurrency,
+        headers={"User-Agent": "medora-ops-bench/1.0", "Accept-Encoding": "gzip, deflate, br"},
+    )
+
+    stats: dict[str, dict[str, Any]] = {}
+    for route in routes:
+        samples = [result for planned, result in zip(plan, results) if planned == route]
+        ok = [result for result in samples if not result.error and result.status < 400]
+        stats[route] = {
+            "count": len(samples),
+            "errors": len(samples) - len(ok),
+            "ttfb": latency_summary([result.ttfb * 1000 for result in ok]),
+            "total": latency_summary([result.elapsed * 1000 for result in ok]),
+        }
+
+    history = load_bench_history()
+    previous = next((run for run in reversed(history) if run.get("base_url") == base_url), None)
+    metric = args.metric
+    regressions: list[str] = []
+    print(
+        f"\n{'route':32} {'n':>4} {'err':>4} {'ttfb p50/p90/p99 ms':>20}   "
+        f"{'total p50/p90/p99 ms':>20}  vs prev {metric}"
+    )
+    for route, stat in stats.items():
+        ttfb, total = stat["ttfb"], stat["total"]
+        line = (
+            f"{route[:32]:32} {stat['count']:>4} {stat['errors']:>4} "
+            f"{ttfb['p50']:>6.0f}/{ttfb['p90']:>6.0f}/{ttfb['p99']:>6.0f}   "
+            f"{total['p50']:>6.0f}/{total['p90']:>6.0f}/{total['p99']:>6.0f}"
+        )
+        before = ((previous or {}).get("routes") or {}).get(route)
+        if before:
+            old, new = before["ttfb"][metric], ttfb[metric]
+            change = (new - old) / old * 100 if old else 0.0
+            line += f"  {old:.0f} -> {new:.0f}ms ({change:+.0f}%)"
+            if new - old > args.min_delta_ms and change > args.threshold:
+                regressions.append(f"{route}: ttfb {metric} {old:.0f} -> {new:.0f}ms ({change:+.0f}%)")
+        print(line)
+
+    history.append(
+        {
+            "deployment": deployment,
+            "base_url": base_url,
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "routes": stats,
+        }
+    )
+    save_bench_history(history)
+
+    if previous:
+        print(f"\nCompared with {previous.get('deployment')} ({previous.get('created')}).")
+    if any(stat["errors"] for stat in stats.values()):
+        raise SystemExit("Benchmark requests failed; see the err column.")
+    if regressions:
+        print(f"Latency regressions over {args.threshold:.0f}%:")
+        print("\n".join(f"  {regression}" for regression in regressions))
+        raise SystemExit(1)
+
+
+class FrameWriter(io.TextIOBase):
+    """Text stream that forwards writes to a daemon client as JSON frames."""
+
+    def __init__(self, sock: socket.socket, stream: str) -> None:
+        self.sock = sock
+        self.stream = stream
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        if text:
+            frame = json.dumps({"stream": self.stream, "data": text}) + "\n"
+            self.sock.sendall(frame.encode("utf-8"))
+        return len(text)
+
+
+class ThreadProfiler:
+    """cProfile for the calling thread and every thread started while it is enabled."""
+
+    def __init__(self) -> None:
+        self.profiles = [cProfile.Profile()]
+        self._lock = threading.Lock()
+
+    def enable(self) -> None:
+        if sys.version_info < (3, 12):
+            # Before 3.12 a profiler only sees the thread that enabled it, so give each
+            # worker thread its own and merge them when writing the stats.
+            threading.setprofile(self._start_thread)
+        self.profiles[0].enable()
+
+    def disable(self) -> None:
+        if sys.version_info < (3, 12):
+            threading.setprofile(None)
+        self.profiles[0].disable()
+
+    def dump_stats(self, path: str) -> int:
+        stats = None
+        merged = 0
+        for profile in self.profiles:
+            try:
+                if stats is None:
+                    stats = pstats.Stats(profile)
+                else:
+                    stats.add(profile)
+            except TypeError:
+                continue  # a thread that made no profiled calls
+            merged += 1
+        if stats is None:
+            Path(path).write_bytes(b"")
+            return 0
+        stats.dump_stats(path)
+        return merged
+
+    def _start_thread(self, *_: Any) -> None:
+        profile = cProfile.Profile()
+        with self._lock:
+            self.profiles.append(profile)
+        profile.enable()
+
+
+def execute(args: argparse.Namespace) -> int:
+    HTTP.timings.clear()
+    if args.trace:
+        TRACE.start()
+    profiler = ThreadProfiler() if args.cprofile else None
+    try:
+        if profiler:
+            profiler.enable()
+        with TRACE.span(args.command, "command"):
+            return command_exit_code(args)
+    finally:
+        if profiler:
+            profiler.disable()
+            threads = profiler.dump_stats(args.cprofile)
+            print(
+                f"Wrote profile of {threads} threads to {args.cprofile} (python3 -m pstats {args.cprofile})",
+                file=sys.stderr,
+            )
+        if args.trace:
+            TRACE.write(Path(args.trace))
+            print(f"Wrote {len(TRACE.events)} trace events to {args.trace}", file=sys.stderr)
+        if args.timings:
+            print(HTTP.report(), file=sys.stderr)
+
+
+def execute_guarded(args: argparse.Namespace) -> int:
+    # The shell and daemon outlive each command, so a crash only fails that command.
+    try:
+        return execute(args)
+    except Exception as error:
+        print(f"{args.command} failed: {type(error).__name__}: {error}", file=sys.stderr)
+        return 1
+
+
+def global_defaults(parser: argparse.ArgumentParser, args: argparse.Namespace) -> dict[str, Any]:
+    names = {
+        action.dest
+        for action in parser._actions
+        if action.dest not in {"help", "command"} and not isinstance(action, argparse._SubParsersAction)
+    }
+    return {name: getattr(args, name) for name in names}
+
+
+def parse_line(
+    parser: argparse.ArgumentParser, argv: list[str], defaults: dict[str, Any]
+) -> argparse.Namespace | None:
+    try:
+        args = parser.parse_args(argv, namespace=argparse.Namespace(**defaults))
+    except SystemExit:
+        return None
+    if args.command in {"shell", "daemon", "run-plan"}:
+        print(f"{args.command} cannot be started from inside another ops command.", file=sys.stderr)
+        return None
+    return args
+
+
+def runs_until_interrupted(args: argparse.Namespace) -> bool:
+    # Log tails never finish on their own; in the daemon they would block every other client.
+    return args.command == "vercel-runtime-logs" or bool(getattr(args, "follow", False))
+
+
+@contextlib.contextmanager
+def client_context(cwd: str | None, environ: dict[str, str] | None) -> Iterator[None]:
+    # Run a forwarded command in the client's directory and environment, so relative
+    # paths and variables mean what they did in the client's shell.
+    saved_cwd, saved_environ = os.getcwd(), dict(os.environ)
+    try:
+        if cwd:
+            os.chdir(cwd)
+        if environ is not None:
+            os.environ.clear()
+            os.environ.update(environ)
+        yield
+    finally:
+        os.chdir(saved_cwd)
+        os.environ.clear()
+        os.environ.update(saved_environ)
+
+
+def cmd_shell(args: argparse.Namespace) -> None:
+    try:
+        import readline
+    except ImportError:
+        readline = None
+    history = STATE_DIR / "shell-history"
+    if readline and history.exists():
+        readline.read_history_file(history)
+
+    parser = build_parser()
+    defaults = global_defaults(parser, args)
+    print("ops shell: HTTP connections and caches stay warm between commands. Type help or exit.")
+    try:
+        while True:
+            try:
+                line = input("ops> ").strip()
+            except EOFError:
+                print()
+                break
+            if line in {"exit", "quit"}:
+                break
+            if not line:
+                continue
+            if line == "help":
+                parser.print_help()
+                continue
+            try:
+                argv = shlex.split(line)
+            except ValueError as error:
+                print(error, file=sys.stderr)
+                continue
+            line_args = parse_line(parser, argv, defaults)
+            if line_args is None:
+                continue
+            started = time.perf_counter()
+            try:
+                code = execute_guarded(line_args)
+            except KeyboardInterrupt:
+                code = 130
+            elapsed = (time.perf_counter() - started) * 1000
+            print(f"[{'ok' if code == 0 else f'exit {code}'} in {elapsed:.0f}ms]", file=sys.stderr)
+    finally:
+        if readline:
+            STATE_DIR.mkdir(exist_ok=True)
+            readline.write_history_file(history)
+
+
+def cmd_daemon(args: argparse.Namespace) -> None:
+    if not hasattr(socket, "AF_UNIX"):
+        raise SystemExit("The ops daemon needs Unix domain sockets.")
+    parser = build_parser()
+    defaults = global_defaults(parser, args)
+    STATE_DIR.mkdir(exist_ok=True)
+    DAEMON_SOCKET.unlink(missing_ok=True)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(DAEMON_SOCKET))
+    DAEMON_SOCKET.chmod(0o600)
+    server.listen()
+    print(f"ops daemon listening on {DAEMON_SOCKET} (Ctrl-C to stop)", flush=True)
+    try:
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                # Commands run one at a time, so switching the process-wide stdout/stderr,
+                # working directory and environment to this client is safe.
+                try:
+                    request = json.loads(conn.makefile("r", encoding="utf-8").readline())
+                    stdout, stderr = FrameWriter(conn, "stdout"), FrameWriter(conn, "stderr")
+                    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                        line_args = parse_line(parser, request["argv"], defaults)
+                        if line_args and runs_until_interrupted(line_args):
+                            conn.sendall((json.dumps({"local": True}) + "\n").encode("utf-8"))
+                            continue
+                        try:
+                            with client_context(request.get("cwd"), request.get("env")):
+                                code = execute_guarded(line_args) if line_args else 2
+                        except OSError as error:
+                            print(f"daemon: {error}", file=sys.stderr)
+                            code = 1
+                    conn.sendall((json.dumps({"exit": code}) + "\n").encode("utf-8"))
+                except Exception as error:
+                    print(f"daemon client error: {error}", file=sys.stderr)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        DAEMON_SOCKET.unlink(missing_ok=True)
+
+
+def forward_to_daemon(argv: list[str]) -> int | None:
+    if not hasattr(socket, "AF_UNIX") or not DAEMON_SOCKET.exists():
+        return None
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(str(DAEMON_SOCKET))
+    except OSError:
+        client.close()
+        return None
+    with client:
+        request = {"argv": argv, "cwd": os.getcwd(), "env": dict(os.environ)}
+        client.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        for raw in client.makefile("r", encoding="utf-8"):
+            frame = json.loads(raw)
+            if "exit" in frame:
+                return frame["exit"]
+            if frame.get("local"):
+                # The daemon does not run commands that never finish; run it here.
+                return None
+            target = sys.stderr if frame["stream"] == "stderr" else sys.stdout
+            target.write(frame["data"])
+            target.flush()
+    return 1
+
+
+@dataclass
+class JobResult:
+    name: str
+    status: str = "pending"
+    code: int = 0
+    started: float = 0.0
+    elapsed: float = 0.0
+
+
+class LinePrefixer(io.TextIOBase):
+    """Per-thread stdout/stderr that prefixes each output line with a job name."""
+
+    def __init__(self, fallback: Any) -> None:
+        self.fallback = fallback
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def writable(self) -> bool:
+        return True
+
+    @contextlib.contextmanager
+    def prefixed(self, prefix: str) -> Iterator[None]:
+        self.local.prefix, self.local.pending = prefix, ""
+        try:
+            yield
+        finally:
+            if self.local.pending:
+                self.write("\n")
+            self.local.prefix = None
+
+    def write(self, text: str) -> int:
+        prefix = getattr(self.local, "prefix", None)
+        if prefix is None:
+            return self.fallback.write(text)
+        *lines, self.local.pending = (self.local.pending + text).split("\n")
+        if lines:
+            with self.lock:
+                self.fallback.write("".join(f"{prefix}{line}\n" for line in lines))
+                self.fallback.flush()
+        return len(text)
+
+    def flush(self) -> None:
+        self.fallback.flush()
+
+
+def run_dag(
+    jobs: dict[str, tuple[list[str], Callable[[], int]]],
+    *,
+    concurrency: int,
+    keep_going: bool = False,
+    cancel: threading.Event | None = None,
+) -> dict[str, JobResult]:
+    for name, (needs, _) in jobs.items():
+        missing = [need for need in needs if need not in jobs]
+        if missing:
+            raise SystemExit(f"{name} depends on unknown step(s): {', '.join(missing)}")
+    remaining = {name: set(needs) for name, (needs, _) in jobs.items()}
+    order: list[str] = []
+    ready = [name for name, needs in remaining.items() if not needs]
+    while ready:
+        name = ready.pop()
+        order.append(name)
+        for other, needs in remaining.items():
+            if name in needs:
+                needs.discard(name)
+                if not needs:
+                    ready.append(other)
+    if len(order) != len(jobs):
+        raise SystemExit(f"Dependency cycle between: {', '.join(sorted(set(jobs) - set(order)))}")
+
+    results = {name: JobResult(name) for name in jobs}
+    started = time.perf_counter()
+
+    def run_job(name: str) -> int:
+        results[name].started = time.perf_counter() - started
+        try:
+            with TRACE.span(name, "job"):
+                return jobs[name][1]()
+        finally:
+            results[name].elapsed = time.perf_counter() - started - results[name].started
+
+    failed = False
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        running: dict[Any, str] = {}
+        try:
+            while True:
+                if not failed or keep_going:
+                    for name in jobs:
+                        result = results[name]
+                        if result.status != "pending" or len(running) >= concurrency:
+                            continue
+                        states = {results[need].status for need in jobs[name][0]}
+                        if states & {"failed", "cancelled", "skipped"}:
+                            result.status = "skipped"
+                        elif states <= {"ok"}:
+                            result.status = "running"
+                            running[pool.submit(run_job, name)] = name
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = results[running.pop(future)]
+                    try:
+                        result.code = future.result()
+                    except Exception as error:
+                        print(f"{result.name} crashed: {error!r}", file=sys.stderr)
+                        result.code = 1
+                    if result.code == 0:
+                        result.status = "ok"
+                    else:
+                        result.status = "cancelled" if cancel and cancel.is_set() else "failed"
+                        failed = True
+                        if cancel and not keep_going:
+                            # Fail fast: tell jobs that are still running to stop.
+                            cancel.set()
+        except BaseException:
+            # Ctrl-C (or a crash in the scheduler): stop running jobs instead of waiting
+            # for them in the pool's shutdown, then let the interrupt propagate.
+            if cancel:
+                cancel.set()
+            raise
+    for result in results.values():
+        if result.status == "pending":
+            result.status = "skipped"
+    return results
+
+
+def print_job_report(results: dict[str, JobResult], wall: float) -> None:
+    width = max([len("step"), *map(len, results)])
+    print(f"\n{'step':<{width}}  {'status':<9} {'start':>8} {'time':>8}")
+    for result in sorted(results.values(), key=lambda item: (item.status == "skipped", item.started)):
+        if result.status == "skipped":
+            print(f"{result.name:<{width}}  {'skipped':<9} {'-':>8} {'-':>8}")
+            continue
+        status = f"exit {result.code}" if result.status == "failed" else result.status
+        print(f"{result.name:<{width}}  {status:<9} {result.started:>7.1f}s {result.elapsed:>7.1f}s")
+    serial = sum(result.elapsed for result in results.values())
+    print(f"Wall time {wall:.1f}s; steps took {serial:.1f}s back to back.")
+
+
+def command_exit_code(args: argparse.Namespace) -> int:
+    try:
+        args.func(args)
+        return 0
+    except SystemExit as error:
+        if error.code is None or isinstance(error.code, int):
+            return error.code or 0
+        print(error.code, file=sys.stderr)
+        return 1
+
+
+def load_plan(path: Path) -> list[dict[str, Any]]:
+    try:
+        plan = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as error:
+        raise SystemExit(f"Could not read plan {path}: {error}") from error
+    steps = plan.get("steps") if isinstance(plan, dict) else plan
+    if not isinstance(steps, list) or not steps:
+        raise SystemExit(f"{path} must contain a non-empty list of steps.")
+
+    parsed: list[dict[str, Any]] = []
+    for index, step in enumerate(steps, start=1):
+        if isinstance(step, (str, list)):
+            step = {"run": step}
+        argv = step.get("run") or step.get("args")
+        if isinstance(argv, str):
+            argv = shlex.split(argv)
+        if not argv:
+            raise SystemExit(f"Plan step {index} has no command.")
+        needs = step.get("needs") or []
+        parsed.append(
+            {
+                "name": step.get("name") or argv[0],
+                "argv": [str(arg) for arg in argv],
+                "needs": [needs] if isinstance(needs, str) else list(needs),
+            }
+        )
+    names = [step["name"] for step in parsed]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise SystemExit(f"Plan step names must be unique; repeated: {', '.join(duplicates)}")
+    return parsed
+
+
+def cmd_run_plan(args: argparse.Namespace) -> None:
+    steps = load_plan(Path(args.plan))
+    parser = build_parser()
+    defaults = global_defaults(parser, args)
+    jobs: dict[str, tuple[list[str], Callable[[], int]]] = {}
+    for step in steps:
+        step_args = parse_line(parser, step["argv"], defaults)
+        if step_args is None:
+            raise SystemExit(f"Plan step {step['name']} is not a runnable ops command.")
+        needs = step["needs"]
+        if args.serial and jobs:
+            needs = sorted(set(needs) | {list(jobs)[-1]})
+        jobs[step["name"]] = (needs, functools.partial(run_plan_step, step["name"], step_args, len(steps) > 1))
+
+    if args.dry_run:
+        for step in steps:
+            needs = jobs[step["name"]][0]
+            after = f"  (after {', '.join(needs)})" if needs else ""
+            print(f"{step['name']}: {printable_cmd(step['argv'])}{after}")
+        return
+
+    stdout, stderr = LinePrefixer(sys.stdout), LinePrefixer(sys.stderr)
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        results = run_dag(jobs, concurrency=max(1, args.concurrency), keep_going=args.keep_going)
+    print_job_report(results, time.perf_counter() - started)
+    if any(result.status != "ok" for result in results.values()):
+        raise SystemExit(1)
+
+
+def run_plan_step(name: str, args: argparse.Namespace, prefix: bool) -> int:
+    label = f"[{name}] " if prefix else ""
+    with sys.stdout.prefixed(label), sys.stderr.prefixed(label):
+        print("started", file=sys.stderr)
+        return command_exit_code(args)
+
+
+def add_bundle_budget_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--js-budget-kb", type=float, default=BUNDLE_JS_BUDGET_KB, help="Allowed JS growth (compressed KB)"
+    )
+    parser.add_argument(
+        "--css-budget-kb", type=float, default=BUNDLE_CSS_BUDGET_KB, help="Allowed CSS growth (compressed KB)"
+    )
+    parser.add_argument("--top", type=int, default=10, help="Chunks listed in the report")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Medora Health Beauty Vercel/Cloudflare ops helper"
+    )
+    parser.add_argument("--vercel-token", help="Defaults to VERCEL_TOKEN")
+    parser.add_argument("--vercel-scope", help="Defaults to VERCEL_SCOPE")
+    parser.add_argument(
+        "--vercel-cli",
+        action="store_true",
+        help="Use npx vercel instead of the Vercel REST API (also OPS_VERCEL_CLI=1)",
+    )
+    parser.add_argument("--cf-token", help="Defaults to CLOUDFLARE_API_TOKEN or CF_API_TOKEN")
+    parser.add_argument("--cf-zone-id", help="Defaults to CLOUDFLARE_ZONE_ID or CF_ZONE_ID")
+    parser.add_argument("--cf-zone-name", help=f"Defaults to {DEFAULT_CF_ZONE_NAME}")
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=300.0,
+        help="Seconds to reuse cached Cloudflare zone/DNS metadata from .ops/cache (zone IDs: 7 days)",
+    )
+    parser.add_argument("--refresh", action="store_true", help="Bypass cached Cloudflare metadata")
+    parser.add_argument(
+        "--via-daemon",
+        action="store_true",
+        help="Run the command in a running `ops.py daemon` (also OPS_DAEMON=1); falls back to local",
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="PATH",
+        help="Write HTTP, subprocess and phase spans as a Chrome trace (open in ui.perfetto.dev)",
+    )
+    parser.add_argument(
+        "--cprofile",
+        metavar="PATH",
+        help="Write cProfile stats for the command and its worker threads to PATH",
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="Print per-request HTTP timings and connection reuse to stderr",
+    )
+
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    whoami = sub.add_parser("vercel-whoami", help="Verify the Vercel token")
+    whoami.set_defaults(func=cmd_vercel_whoami)
+
+    deploy = sub.add_parser("vercel-deploy", help="Build locally, then deploy to Vercel")
+    deploy.add_argument("--prod", action=argparse.BooleanOptionalAction, default=True)
+    deploy.add_argument("--skip-build", action="store_true", help="Skip local npm run build verification")
+    deploy.add_argument(
+        "--preflight",
+        action="store_true",
+        help="Build with the concurrent preflight jobs (including vitest) instead of npm run build",
+    )
+    deploy.add_argument("--force-build", action="store_true", help="Ignore the cached build output")
+    deploy.add_argument(
+        "--build-cache-max-age",
+        type=float,
+        default=24,
+        help="Hours a cached dist/ stays reusable; the sitemap also pulls Supabase data (0 disables reuse)",
+    )
+    deploy.add_argument("--archive", choices=["tgz"], help="Pass through to vercel deploy --archive")
+    deploy.add_argument(
+        "--purge",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="After a production deploy, purge Cloudflare URLs whose dist/ content changed",
+    )
+    deploy.add_argument(
+        "--site-origin",
+        action="append",
+        help="Origin to purge changed paths on. Can be repeated. Defaults to apex and www.",
+    )
+    add_bundle_budget_arguments(deploy)
+    deploy.add_argument(
+        "--bundle-budget",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="Fail before deploying if compressed JS/CSS grew past the budget since the last production deploy",
+    )
+    deploy.set_defaults(func=cmd_vercel_deploy)
+
+    bundle = sub.add_parser("bundle-report", help="Raw/gzip/brotli sizes of dist/ per chunk and entry point")
+    add_bundle_budget_arguments(bundle)
+    bundle.add_argument("--format", choices=["text", "json"], default="text")
+    bundle.set_defaults(func=cmd_bundle_report)
+
+    preflight = sub.add_parser("preflight", help="Run the build steps and vitest concurrently with captured logs")
+    preflight.add_argument("--skip-build", action="store_true", help="Only run the tests")
+    preflight.add_argument("--skip-tests", action="store_true", help="Only run the build steps")
+    preflight.add_argument(
+        "--test-shards", type=int, default=os.cpu_count() or 1, help="Parallel vitest processes (default: CPUs)"
+    )
+    preflight.add_argument("--concurrency", type=int, help="Jobs to run at once (default: all)")
+    preflight.add_argument("--keep-going", action="store_true", help="Do not stop other jobs after a failure")
+    preflight.set_defaults(func=cmd_preflight)
+
+    test = sub.add_parser("test", help="Run the vitest suite in parallel shards balanced by recorded file timings")
+    test.add_argument("--shards", type=int, default=os.cpu_count() or 1, help="Parallel vitest processes")
+    test.add_argument("--dry-run", action="store_true", help="Print the shard plan without running it")
+    test.set_defaults(func=cmd_test)
+
+    list_cmd = sub.add_parser("vercel-list", help="List Vercel deployments")
+    list_cmd.add_argument("--project", default=DEFAULT_PROJECT)
+    list_cmd.add_argument("--environment", choices=["production", "preview", "development"])
+    list_cmd.add_argument("--status", help="READY, ERROR, BUILDING, etc.")
+    list_cmd.add_argument("--limit", type=int, default=20, help="API mode only")
+    list_cmd.set_defaults(func=cmd_vercel_list)
+
+    build_logs = sub.add_parser("vercel-build-logs", help="Read Vercel build logs for a deployment")
+    build_logs.add_argument("--deployment")
+    build_logs.set_defaults(func=cmd_vercel_build_logs)
+
+    runtime_logs = sub.add_parser("vercel-runtime-logs", help="Tail Vercel runtime logs for a deployment")
+    runtime_logs.add_argument(
+        "--deployment",
+        action="append",
+        help="Deployment URL/ID. Repeat to merge several deployments into one time-ordered stream.",
+    )
+    runtime_logs.add_argument("--json", action="store_true")
+    runtime_logs.add_argument("--status", help="Only these statuses, e.g. 500, 5xx or 429,5xx")
+    runtime_logs.add_argument("--path", help="Only request paths matching this regex")
+    runtime_logs.add_argument("--min-duration", type=float, help="Only requests slower than N ms")
+    runtime_logs.add_argument("--level", help="Only this log level, e.g. error")
+    runtime_logs.add_argument("--tee", help="Also append matching raw JSON lines to this file")
+    runtime_logs.add_argument(
+        "--buffer",
+        type=int,
+        default=10_000,
+        help="Ring buffer size in lines; the oldest lines are dropped if output falls behind",
+    )
+    runtime_logs.add_argument(
+        "--reorder-window",
+        type=float,
+        default=2.0,
+        help="Seconds to hold lines for time-ordering when merging several deployments",
+    )
+    runtime_logs.set_defaults(func=cmd_vercel_runtime_logs)
+
+    log_latency = sub.add_parser(
+        "log-latency", help="Per-route latency percentiles and error rates from Vercel runtime logs"
+    )
+    log_latency.add_argument(
+        "--deployment",
+        action="append",
+        help="Deployment URL/ID. Repeat to compare several deployments side by side.",
+    )
+    log_latency.add_argument("--seconds", type=float, default=300, help="How long to collect live logs")
+    log_latency.add_argument("--minutes", type=float, help="Only entries from the last N minutes")
+    log_latency.add_argument(
+        "--input",
+        action="append",
+        help="Read saved runtime-log NDJSON (e.g. from --tee) instead of tailing. Can be repeated.",
+    )
+    log_latency.add_argument("--top", type=int, default=30)
+    log_latency.add_argument("--buffer", type=int, default=10_000)
+    log_latency.add_argument("--reorder-window", type=float, default=2.0)
+    log_latency.set_defaults(func=cmd_log_latency)
+
+    cf_zone = sub.add_parser("cf-zone", help="Show Cloudflare zone details")
+    cf_zone.set_defaults(func=cmd_cf_zone)
+
+    cache_clear = sub.add_parser(
+        "cf-metadata-cache-clear", help="Invalidate cached Cloudflare zone/DNS metadata"
+    )
+    cache_clear.add_argument("--all", action="store_true", help="Clear entries for every token")
+    cache_clear.add_argument("--match", help="Only entries whose key contains this text, e.g. dns_records")
+    cache_clear.set_defaults(func=cmd_cf_metadata_cache_clear)
+
+    budget = sub.add_parser("cf-budget", help="Show the Cloudflare request budget shared by local ops processes")
+    budget.add_argument("--reset", action="store_true", help="Refill the budget, e.g. after changing tokens")
+    budget.set_defaults(func=cmd_cf_budget)
+
+    cf_verify = sub.add_parser("cf-token-verify", help="Verify the Cloudflare API token")
+    cf_verify.set_defaults(func=cmd_cf_token_verify)
+
+    cf_zones = sub.add_parser("cf-zones", help="List Cloudflare zones visible to the token")
+    cf_zones.set_defaults(func=cmd_cf_zones)
+
+    cf_dns = sub.add_parser("cf-dns", help="List Cloudflare DNS records")
+    cf_dns.add_argument("--json", action="store_true", help="Print records in the cf-dns-apply file format")
+    cf_dns.set_defaults(func=cmd_cf_dns)
+
+    dns_apply = sub.add_parser("cf-dns-apply", help="Make Cloudflare DNS match a JSON file of records")
+    dns_apply.add_argument("records", help="JSON list of {type, name, content, ttl?, proxied?, ...}")
+    dns_apply.add_argument("--dry-run", action="store_true", help="Print the diff without applying it")
+    dns_apply.add_argument("--prune", action="store_true", help="Also delete unlisted type/names")
+    dns_apply.add_argument("--batch-size", type=int, default=DNS_BATCH_SIZE, help="Changes per batch request")
+    dns_apply.set_defaults(func=cmd_cf_dns_apply)
+
+    purge = sub.add_parser("cf-purge", help="Purge Cloudflare CDN cache")
+    purge.add_argument("--everything", action="store_true")
+    purge.add_argument("--url", action="append", help="Purge a specific URL. Can be repeated.")
+    purge.add_argument("--url-file", action="append", help="File with one URL per line. Can be repeated.")
+    purge.add_argument(
+        "--sitemap",
+        action="append",
+        nargs="?",
+        const=str(DEFAULT_SITEMAP),
+        help="Purge every <loc> in a sitemap path or URL (default public/sitemap.xml)",
+    )
+    purge.add_argument(
+        "--prefix",
+        action="append",
+        help="Purge a URL prefix such as medorabeauty.com/procedure/. Can be repeated.",
+    )
+    purge.add_argument("--chunk-size", type=int, default=CF_PURGE_CHUNK, help="URLs per purge API call")
+    purge.add_argument("--concurrency", type=int, default=4)
+    purge.add_argument("--rate", type=float, default=5.0, help="Max purge API calls per second")
+    purge.set_defaults(func=cmd_cf_purge)
+
+    cache_stats = sub.add_parser(
+        "cf-cache-stats", help="Cloudflare cache hit ratio and origin load by path and content type"
+    )
+    cache_stats.add_argument("--minutes", type=int, default=60)
+    cache_stats.add_argument("--host", help="Only count requests for this hostname")
+    cache_stats.add_argument("--depth", type=int, default=1, help="Path segments used for the prefix breakdown")
+    cache_stats.add_argument("--top", type=int, default=15, help="Rows per breakdown")
+    cache_stats.add_argument("--group-limit", type=int, default=10000, help="Max groups per GraphQL request")
+    cache_stats.add_argument("--format", choices=["text", "json"], default="text")
+    cache_stats.set_defaults(func=cmd_cf_cache_stats)
+
+    security = sub.add_parser("cf-security-events", help="Read recent Cloudflare security/firewall events")
+    security.add_argument("--minutes", type=int, default=60)
+    security.add_argument("--limit", type=int, default=20, help="Max events to read; 0 streams every event")
+    security.add_argument("--page-size", type=int, default=1000, help="Events per GraphQL request")
+    security.add_argument("--format", choices=["text", "ndjson"], default="text")
+    security.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="Split the window into N time shards fetched concurrently",
+    )
+    security.add_argument(
+        "--rate",
+        type=float,
+        default=1.0,
+        help="Max GraphQL requests per second across shards",
+    )
+    security.add_argument("--follow", action="store_true", help="Keep polling for new events")
+    security.add_argument(
+        "--aggregate",
+        action="store_true",
+        help="Summarize every event in the window (ignores --limit): top-k and per-minute rates",
+    )
+    security.add_argument("--top", type=int, default=10, help="Entries per --aggregate table")
+    security.add_argument(
+        "--counters",
+        type=int,
+        default=1000,
+        help="Space-Saving counters per field; bounds --aggregate memory",
+    )
+    security.add_argument("--input", help="With --aggregate, read NDJSON events from a file or - for stdin")
+    security.add_argument("--interval", type=float, default=15.0, help="Seconds between --follow polls")
+    security.add_argument(
+        "--follow-lag",
+        type=float,
+        default=120.0,
+        help="Seconds of overlap re-read on each poll to catch late-indexed events",
+    )
+    security.set_defaults(func=cmd_cf_security_events)
+
+    events_sync = sub.add_parser(
+        "events-sync", help="Append new Cloudflare security events to the local SQLite store"
+    )
+    events_sync.add_argument(
+        "--minutes",
+        type=int,
+        default=1440,
+        help="How far back to read on the first sync, and the oldest point any sync reaches",
+    )
+    events_sync.add_argument("--overlap", type=int, default=120, help="Seconds re-read before the last sync")
+    events_sync.add_argument("--page-size", type=int, default=1000)
+    events_sync.add_argument("--shards", type=int, default=1)
+    events_sync.add_argument("--rate", type=float, default=1.0)
+    events_sync.set_defaults(func=cmd_events_sync)
+
+    events_query = sub.add_parser("events-query", help="Filter or group security events from the local store")
+    events_query.add_argument("--minutes", type=int, help="Only events from the last N minutes")
+    events_query.add_argument("--ip")
+    events_query.add_argument("--path", help="SQL LIKE pattern, e.g. /api/%%")
+    events_query.add_argument("--action")
+    events_query.add_argument("--country")
+    events_query.add_argument("--host")
+    events_query.add_argument("--source")
+    events_query.add_argument(
+        "--group-by",
+        action="append",
+        help="Count by field (ip, path, country, host, ua, minute or a column). Can be repeated.",
+    )
+    events_query.add_argument("--limit", type=int, default=50)
+    events_query.add_argument("--format", choices=["text", "ndjson"], default="text")
+    events_query.set_defaults(func=cmd_events_query)
+
+    warm = sub.add_parser("cache-warm", help="Request every sitemap/manifest URL to warm the Cloudflare cache")
+    warm.add_argument(
+        "--sitemap",
+        action="append",
+        help="Sitemap path or URL. Can be repeated. Defaults to public/sitemap.xml.",
+    )
+    warm.add_argument(
+        "--manifest",
+        nargs="?",
+        const=str(BUILD_MANIFEST_FILE),
+        help="Warm every file in a deploy manifest (default .ops/manifests/latest-build.json)",
+    )
+    warm.add_argument("--url", action="append", help="Warm a specific URL. Can be repeated.")
+    warm.add_argument("--url-file", action="append", help="File with one URL per line. Can be repeated.")
+    warm.add_argument("--site-origin", action="append", help="Origin for manifest paths")
+    warm.add_argument("--origin", help="Rewrite every URL onto this origin, e.g. http://127.0.0.1:8080")
+    warm.add_argument("--concurrency", type=int, default=16)
+    warm.add_argument("--quiet", action="store_true", help="Only print the summary")
+    warm.set_defaults(func=cmd_cache_warm)
+
+    audit = sub.add_parser("cache-audit", help="Check live cache headers against vercel.json rules")
+    audit.add_argument(
+        "--sitemap",
+        action="append",
+        help="Sitemap path or URL. Can be repeated. Defaults to public/sitemap.xml.",
+    )
+    audit.add_argument(
+        "--manifest",
+        nargs="?",
+        const=str(BUILD_MANIFEST_FILE),
+        help="Audit every file in a deploy manifest (default .ops/manifests/latest-build.json)",
+    )
+    audit.add_argument("--url", action="append", help="Audit a specific URL. Can be repeated.")
+    audit.add_argument("--url-file", action="append", help="File with one URL per line. Can be repeated.")
+    audit.add_argument("--site-origin", action="append", help="Origin for manifest paths")
+    audit.add_argument("--origin", help="Rewrite every URL onto this origin, e.g. a preview deployment")
+    audit.add_argument("--no-assets", action="store_true", help="Only audit the pages, not the assets they link")
+    audit.add_argument("--concurrency", type=int, default=16)
+    audit.add_argument("--top", type=int, default=10, help="URLs listed per finding")
+    audit.add_argument("--verbose", action="store_true", help="Print the recorded headers for every URL")
+    audit.add_argument("--format", choices=["text", "json"], default="text")
+    audit.set_defaults(func=cmd_cache_audit)
+
+    bench = sub.add_parser("bench", help="Benchmark route latency and compare with the previous run")
+    bench.add_argument("--base-url", default=DEFAULT_SITE_ORIGINS[0])
+    bench.add_argument("--route", action="append", help="Route to benchmark. Can be repeated.")
+    bench.add_argument("--requests", type=int, default=20, help="Requests per route")
+    bench.add_argument("--concurrency", type=int, default=4)
+    bench.add_argument("--deployment", help="History key. Defaults to the last vercel-deploy URL.")
+    bench.add_argument("--metric", choices=["p50", "p90", "p99"], default="p90")
+    bench.add_argument("--threshold", type=float, default=20.0, help="Regression threshold in percent")
+    bench.add_argument("--min-delta-ms", type=float, default=25.0, help="Ignore smaller absolute changes")
+    bench.set_defaults(func=cmd_bench)
+
+    plan = sub.add_parser("run-plan", help="Run several ops commands in one process, in dependency order")
+    plan.add_argument("plan", help="JSON plan: a list of steps with run/name/needs")
+    plan.add_argument("--concurrency", type=int, default=4, help="Steps to run at once")
+    plan.add_argument("--serial", action="store_true", help="Run steps one after another in file order")
+    plan.add_argument("--keep-going", action="store_true", help="Start independent steps after a failure")
+    plan.add_argument("--dry-run", action="store_true", help="Print the steps without running them")
+    plan.set_defaults(func=cmd_run_plan)
+
+    shell = sub.add_parser("shell", help="Interactive ops shell that keeps connections and caches warm")
+    shell.set_defaults(func=cmd_shell)
+
+    daemon = sub.add_parser("daemon", help="Serve ops commands on a local Unix socket (.ops/ops.sock)")
+    daemon.set_defaults(func=cmd_daemon)
+
+    return parser
+
+
+def main() -> None:
+    argv = sys.argv[1:]
+    load_dotenv()
+    if "--via-daemon" in argv or env("OPS_DAEMON"):
+        code = forward_to_daemon([arg for arg in argv if arg != "--via-daemon"])
+        if code is not None:
+            raise SystemExit(code)
 
-def main() -> None:
-    load_dotenv()
     parser = build_parser()
-    args = parser.parse_args()
-    args.func(args)
+    args = parser.parse_args(argv)
+    try:
+        code = execute(args)
+    finally:
+        HTTP.close()
+    raise SystemExit(code)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,274 @@
+import contextlib
+import http.server
+import io
+import json
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest import mock
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import ops  # noqa: E402
+
+ZONE = "medorabeauty.com"
+
+
+def record(record_id: str, kind: str, name: str, content: str, **fields) -> dict:
+    return {"id": record_id, "type": kind, "name": name, "content": content, **fields}
+
+
+class LoadDnsRecordsTest(unittest.TestCase):
+    def load(self, records: list[dict]) -> list[dict]:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "dns.json"
+            path.write_text(json.dumps(records), encoding="utf-8")
+            return ops.load_dns_records(path, ZONE)
+
+    def test_names_are_normalised_to_the_zone(self) -> None:
+        loaded = self.load([
+            {"type": "a", "name": "@", "content": "1.1.1.1"},
+            {"type": "CNAME", "name": "www", "content": ZONE},
+            {"type": "TXT", "name": "Mail.Medorabeauty.com.", "content": "v=spf1"},
+            {"type": "A", "name": ZONE, "content": "1.1.1.2"},
+        ])
+        self.assertEqual(
+            [(item["type"], item["name"]) for item in loaded],
+            [("A", ZONE), ("CNAME", f"www.{ZONE}"), ("TXT", f"mail.{ZONE}"), ("A", ZONE)],
+        )
+
+    def test_missing_fields_are_reported(self) -> None:
+        with self.assertRaises(SystemExit) as raised:
+            self.load([{"type": "A", "name": "www"}])
+        self.assertIn("missing content", str(raised.exception))
+
+
+class DiffDnsRecordsTest(unittest.TestCase):
+    def test_matching_content_is_kept(self) -> None:
+        existing = [record("1", "A", ZONE, "1.1.1.1"), record("2", "A", ZONE, "1.1.1.2")]
+        desired = [{"type": "A", "name": ZONE, "content": "1.1.1.2"}]
+        posts, patches, deletes = ops.diff_dns_records(existing, desired, prune=False)
+        self.assertEqual(posts, [])
+        self.assertEqual(patches, [])
+        self.assertEqual([item["id"] for item in deletes], ["1"])
+
+    def test_matching_content_with_other_fields_changed_is_patched(self) -> None:
+        existing = [record("1", "A", ZONE, "1.1.1.1", proxied=False)]
+        desired = [{"type": "A", "name": ZONE, "content": "1.1.1.1", "proxied": True}]
+        posts, patches, deletes = ops.diff_dns_records(existing, desired, prune=False)
+        self.assertEqual((posts, deletes), ([], []))
+        self.assertEqual([(item["id"], changes) for item, changes in patches], [("1", {"proxied": True})])
+
+    def test_existing_record_is_reused_via_patch(self) -> None:
+        existing = [record("1", "CNAME", f"www.{ZONE}", "old.example.com", ttl=1)]
+        desired = [{"type": "CNAME", "name": f"www.{ZONE}", "content": "new.example.com"}]
+        posts, patches, deletes = ops.diff_dns_records(existing, desired, prune=False)
+        self.assertEqual((posts, deletes), ([], []))
+        self.assertEqual(
+            [(item["id"], changes) for item, changes in patches], [("1", {"content": "new.example.com"})]
+        )
+
+    def test_extra_records_are_created(self) -> None:
+        existing = [record("1", "A", ZONE, "1.1.1.1")]
+        desired = [
+            {"type": "A", "name": ZONE, "content": "1.1.1.1"},
+            {"type": "A", "name": ZONE, "content": "1.1.1.2"},
+        ]
+        posts, patches, deletes = ops.diff_dns_records(existing, desired, prune=False)
+        self.assertEqual(([item["content"] for item in posts], patches, deletes), (["1.1.1.2"], [], []))
+
+    def test_unlisted_records_are_only_deleted_with_prune(self) -> None:
+        existing = [record("1", "A", ZONE, "1.1.1.1"), record("2", "TXT", ZONE, "v=spf1")]
+        desired = [{"type": "A", "name": ZONE, "content": "1.1.1.1"}]
+        self.assertEqual(ops.diff_dns_records(existing, desired, prune=False), ([], [], []))
+        posts, patches, deletes = ops.diff_dns_records(existing, desired, prune=True)
+        self.assertEqual((posts, patches, [item["id"] for item in deletes]), ([], [], ["2"]))
+
+
+class DnsBatchesTest(unittest.TestCase):
+    def test_a_group_is_never_split_across_batches(self) -> None:
+        deletes = [record("1", "A", ZONE, "1.1.1.1"), record("2", "TXT", ZONE, "a")]
+        posts = [
+            {"type": "A", "name": ZONE, "content": "2.2.2.2"},
+            {"type": "TXT", "name": ZONE, "content": "b"},
+        ]
+        batches = ops.dns_batches(deletes, [], posts, 3)
+        self.assertEqual(
+            [[(group, kind) for group, kind, _ in batch] for batch in batches],
+            [
+                [(f"A {ZONE}", "deletes"), (f"A {ZONE}", "posts")],
+                [(f"TXT {ZONE}", "deletes"), (f"TXT {ZONE}", "posts")],
+            ],
+        )
+
+    def test_a_group_larger_than_a_batch_is_split(self) -> None:
+        posts = [{"type": "A", "name": ZONE, "content": f"1.1.1.{index}"} for index in range(5)]
+        batches = ops.dns_batches([], [], posts, 2)
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+
+
+class FakeFirewallEvents:
+    """Stand-in for the firewallEventsAdaptive GraphQL query over a fixed event list."""
+
+    def __init__(self, events: list[dict]) -> None:
+        self.events = events
+        self.pages = 0
+
+    def __call__(self, token: str, query: str, variables: dict) -> dict:
+        self.pages += 1
+        if self.pages > len(self.events) + 10:
+            raise AssertionError("pagination does not terminate")
+        page_filter = variables["filter"]
+        checks = {
+            "datetime_geq": lambda value, bound: value >= bound,
+            "datetime_leq": lambda value, bound: value <= bound,
+            "datetime_gt": lambda value, bound: value > bound,
+            "datetime_lt": lambda value, bound: value < bound,
+        }
+        matched = [
+            event
+            for event in self.events
+            if all(checks[name](event["datetime"], bound) for name, bound in page_filter.items())
+        ]
+        matched.sort(key=lambda event: (event["datetime"], event["rayName"]), reverse="DESC" in query)
+        return {"viewer": {"zones": [{"firewallEventsAdaptive": matched[: variables["limit"]]}]}}
+
+
+class IterFirewallEventsTest(unittest.TestCase):
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+    def events(self, per_second: list[int]) -> list[dict]:
+        events = []
+        for second, count in enumerate(per_second):
+            stamp = ops.cf_time(self.start + timedelta(seconds=second))
+            events.extend({"datetime": stamp, "rayName": f"{second}-{index}"} for index in range(count))
+        return events
+
+    def read(self, events: list[dict], *, page_size: int, descending: bool) -> tuple[list[dict], int, str]:
+        fake = FakeFirewallEvents(events)
+        stderr = io.StringIO()
+        end = self.start + timedelta(hours=1)
+        with mock.patch.object(ops, "cf_graphql", fake), contextlib.redirect_stderr(stderr):
+            found = list(
+                ops.iter_firewall_events("t", "zone", self.start, end, page_size=page_size, descending=descending)
+            )
+        return found, fake.pages, stderr.getvalue()
+
+    def test_pages_are_complete_without_duplicates(self) -> None:
+        # 5000 events, mostly several per second, so page edges keep landing mid-second.
+        per_second = [(second * 7) % 5 + 1 for second in range(1700)]
+        events = self.events(per_second)[:5000]
+        self.assertEqual(len(events), 5000)
+        for descending in (False, True):
+            with self.subTest(descending=descending):
+                found, pages, warnings = self.read(events, page_size=100, descending=descending)
+                keys = [event["rayName"] for event in found]
+                self.assertEqual(len(keys), len(set(keys)))
+                self.assertEqual(sorted(keys), sorted(event["rayName"] for event in events))
+                stamps = [event["datetime"] for event in found]
+                self.assertEqual(stamps, sorted(stamps, reverse=descending))
+                self.assertGreater(pages, 50)
+                self.assertEqual(warnings, "")
+
+    def test_a_full_page_in_one_second_is_stepped_past(self) -> None:
+        # Second 1 holds more events than fit in a page: the rest of that second is
+        # skipped with a warning, but reading continues on both sides of it.
+        events = self.events([3, 25, 4])
+        for descending in (False, True):
+            with self.subTest(descending=descending):
+                found, _, warnings = self.read(events, page_size=10, descending=descending)
+                keys = [event["rayName"] for event in found]
+                self.assertEqual(len(keys), len(set(keys)))
+                outside = {event["rayName"] for event in events if not event["rayName"].startswith("1-")}
+                self.assertLessEqual(outside, set(keys))
+                self.assertIn("more than 10 events", warnings)
+
+
+class LptShardsTest(unittest.TestCase):
+    def test_longest_files_are_spread_first(self) -> None:
+        durations = {"a": 8.0, "b": 7.0, "c": 6.0, "d": 5.0, "e": 4.0}
+        self.assertEqual(ops.lpt_shards(durations, 2), [(17.0, ["a", "d", "e"]), (13.0, ["b", "c"])])
+
+    def test_loads_stay_balanced(self) -> None:
+        durations = {f"test/{index}.test.ts": float(index % 7 + 1) for index in range(40)}
+        shards = ops.lpt_shards(durations, 4)
+        loads = [load for load, _ in shards]
+        self.assertEqual(sorted(name for _, files in shards for name in files), sorted(durations))
+        self.assertLessEqual(max(loads) - min(loads), max(durations.values()))
+
+    def test_empty_shards_are_dropped(self) -> None:
+        self.assertEqual(ops.lpt_shards({"a": 1.0, "b": 2.0}, 4), [(2.0, ["b"]), (1.0, ["a"])])
+
+
+class StandInHandler(http.server.BaseHTTPRequestHandler):
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def do_GET(self) -> None:
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        try:
+            time.sleep(0.2)
+            status = 404 if self.path.startswith("/missing") else 200
+            body = b"ok"
+            self.send_response(status)
+            self.send_header("cf-cache-status", "HIT" if self.path.endswith("/0") else "MISS")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with cls.lock:
+                cls.in_flight -= 1
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class FetchUrlsTest(unittest.TestCase):
+    def setUp(self) -> None:
+        StandInHandler.max_in_flight = 0
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+        self.server.request_queue_size = 128
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.origin = f"http://127.0.0.1:{self.server.server_port}"
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        ops.HTTP.close()
+
+    def test_results_keep_status_and_cache_status_per_url(self) -> None:
+        urls = [f"{self.origin}/page/{index}" for index in range(3)] + [f"{self.origin}/missing"]
+        results = ops.fetch_urls(urls, concurrency=4)
+        self.assertEqual([result.url for result in results], urls)
+        self.assertEqual([result.status for result in results], [200, 200, 200, 404])
+        self.assertEqual(
+            [result.headers.get("cf-cache-status") for result in results], ["HIT", "MISS", "MISS", "MISS"]
+        )
+        self.assertTrue(all(result.error is None for result in results))
+
+    def test_concurrency_is_not_capped_by_the_default_executor(self) -> None:
+        urls = [f"{self.origin}/page/{index}" for index in range(64)]
+        ops.fetch_urls(urls, concurrency=40)
+        # asyncio's default executor would stop at min(32, cpu + 4) threads.
+        self.assertGreater(StandInHandler.max_in_flight, 32)
+        self.assertLessEqual(StandInHandler.max_in_flight, 40)
+
+    def test_connection_errors_are_reported_per_url(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        with mock.patch.object(ops.HTTP, "max_retries", 0):
+            results = ops.fetch_urls([f"{self.origin}/page/1"], concurrency=1)
+        self.assertEqual(results[0].status, 0)
+        self.assertIsNotNone(results[0].error)
+
+
+if __name__ == "__main__":
+    unittest.main()